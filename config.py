@@ -1,42 +1,89 @@
-import os
-from dotenv import load_dotenv
+from functools import lru_cache
+from pydantic_settings import BaseSettings, SettingsConfigDict
 
-load_dotenv()
-
-class Settings:
+class Settings(BaseSettings):
+    """Application settings, read once from the environment and .env file"""
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
+    
     # API Configuration
-    API_V1_PREFIX = "/api/v1"
-    PROJECT_NAME = "HackRx 6.0 - Intelligent Query-Retrieval System"
-    VERSION = "1.0.0"
+    API_V1_PREFIX: str = "/api/v1"
+    PROJECT_NAME: str = "HackRx 6.0 - Intelligent Query-Retrieval System"
+    VERSION: str = "1.0.0"
     
     # LLM Configuration
-    GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-    GEMINI_MODEL = "gemini-1.5-flash"
+    GEMINI_API_KEY: str = ""
+    GEMINI_MODEL: str = "gemini-1.5-flash"
+    GEMINI_BACKEND: str = "sdk"  # "sdk" (google-generativeai) or "rest" (httpx + orjson)
+    GEMINI_TRANSPORT: str = "grpc"  # grpc reuses one HTTP/2 channel; async calls use its grpc_asyncio twin
+    GEMINI_API_ENDPOINT: str = ""  # Optional regional or proxy endpoint
+    LLM_MAX_CONCURRENCY: int = 32  # Gemini calls in flight at once; LLM_RPM still bounds the request rate
+    LLM_RPM: int = 60  # Gemini requests per minute
+    LLM_MAX_RETRIES: int = 5  # Attempts per Gemini call on 429/5xx/timeouts
+    LLM_RETRY_MAX_DELAY: float = 10.0  # Upper bound of the jittered backoff, seconds
+    STREAM_EARLY_ANSWER: bool = True  # Stop streaming once the answer is complete when reasoning isn't returned
+    GEMINI_CONTEXT_CACHE: bool = False  # Serve the static answer instructions from a Gemini context cache
+    GEMINI_CONTEXT_CACHE_TTL: int = 3600  # Seconds before the context cache is refreshed
+    USE_BATCH_MODE: bool = False  # Send question sets to Gemini Batch Mode (cheaper, slower)
+    BATCH_MODE_MIN_LATENCY: float = 60.0  # Only use batch mode when the caller can wait this long
+    BATCH_MODE_MAX_WAIT: float = 3600.0  # Polling limit when no latency budget is given
     
     # Pinecone Configuration
-    PINECONE_API_KEY = os.getenv("PINECONE_API_KEY", "")
-    PINECONE_ENVIRONMENT = os.getenv("PINECONE_ENVIRONMENT", "us-east-1-aws")
-    PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "hackrx-docs")
-    PINECONE_ENDPOINT = os.getenv("PINECONE_ENDPOINT", "")
+    PINECONE_API_KEY: str = ""
+    PINECONE_ENVIRONMENT: str = "us-east-1-aws"
+    PINECONE_INDEX_NAME: str = "hackrx-docs"
+    PINECONE_ENDPOINT: str = ""
+    PINECONE_UPSERT_CONCURRENCY: int = 8
+    PINECONE_POOL_THREADS: int = 32  # Connection pool / worker threads of the Pinecone index client
+    PINECONE_LOCAL_CONTENT: bool = False  # Keep chunk text in a local SQLite store instead of Pinecone metadata
+    CHUNK_STORE_PATH: str = "data/chunk_store.sqlite"
     
     # Embedding Configuration
-    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
-    EMBEDDING_DIMENSION = int(os.getenv("EMBEDDING_DIMENSION", "384"))
+    EMBEDDING_MODEL: str = "all-MiniLM-L6-v2"
+    EMBEDDING_DIMENSION: int = 384
+    PRETOKENIZE_CHUNKS: bool = True  # Tokenize chunks at creation and embed from token ids
+    EMBEDDING_BATCH_SIZE: int = 64
+    EMBEDDING_BACKEND: str = "torch"  # "torch" (sentence-transformers) or "onnx"
+    ONNX_MODEL_DIR: str = "data/onnx_model"
+    ONNX_QUANTIZE: bool = True  # int8 dynamic quantization of the exported model
+    EMBEDDING_TORCH_COMPILE: bool = False  # torch.compile the transformer (torch >= 2.0)
     
     # Document Processing
-    MAX_CHUNK_SIZE = 1000
-    CHUNK_OVERLAP = 200
-    MAX_TOKENS_PER_REQUEST = 30000
+    MAX_CHUNK_SIZE: int = 1000
+    CHUNK_OVERLAP: int = 200
+    MAX_TOKENS_PER_REQUEST: int = 30000
     
     # FAISS Configuration
-    FAISS_INDEX_PATH = "data/faiss_index"
+    FAISS_INDEX_PATH: str = "data/faiss_index"
+    HNSW_MIN_VECTORS: int = 10_000  # Below this an exact IndexFlatIP scan is used
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    FAISS_FP16: bool = True  # Store FAISS vectors as float16
+    FAISS_INT8: bool = False  # Store FAISS vectors as 8-bit codes; takes precedence over FAISS_FP16
     
     # Cache Configuration
-    ENABLE_CACHE = True
-    CACHE_TTL = 3600  # 1 hour
+    ENABLE_CACHE: bool = True
+    CACHE_TTL: int = 3600  # 1 hour
+    DOC_CACHE_DIR: str = "data/doc_cache"
+    DOC_CACHE_MAX_ENTRIES: int = 128
+    DOC_CACHE_DISK_MAX_ENTRIES: int = 1024  # Parsed documents kept in DOC_CACHE_DIR; least recently used are evicted
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite"
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024
+    ANSWER_CACHE_SIZE: int = 1024  # Answers kept by the semantic answer cache
+    ANSWER_CACHE_TTL: float = 600.0  # seconds
+    ANSWER_CACHE_THRESHOLD: float = 0.9  # Minimum question-to-question cosine similarity for a hit
     
     # Performance
-    MAX_CONCURRENT_REQUESTS = 10
-    REQUEST_TIMEOUT = 30
+    MAX_CONCURRENT_REQUESTS: int = 10
+    MAX_DOWNLOAD_CONCURRENCY: int = 8
+    WORKER_THREADS: int = 0  # Parse pool size for CPU-bound PDF/DOCX parsing and chunking; 0 = one per CPU core
+    REQUEST_TIMEOUT: int = 30
+    HEALTH_CACHE_TTL: float = 5.0  # seconds
+    LOG_LEVEL: str = "INFO"  # Root log level; DEBUG adds per-request progress messages
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the process-wide settings instance, parsing the environment only once"""
+    return Settings()
 
-settings = Settings()
+settings = get_settings()
@@ -1,29 +1,63 @@
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 import asyncio
+import logging
+import logging.handlers
+import os
+import queue
 import time
 from contextlib import asynccontextmanager
-from typing import Dict, Any
+from typing import Annotated, Dict, Any, Optional, Tuple
 
 from config import settings
 from models.schemas import QueryRequest, QueryResponse, ErrorResponse, LegacyQueryRequest
 from services.query_service import QueryService
+from services.document_processor import create_http_client
 
-# Global service instance
-query_service = None
+# Last health probe result, served to frequent liveness/readiness polls
+_health_cache: Dict[str, Any] = {"status": None, "ts": 0.0}
+
+def _find_local_doc() -> Tuple[Optional[str], str]:
+    """Locate the first supported document in the docs folder
+    
+    Returns the document path, or None together with the error detail to report.
+    """
+    docs_folder = os.path.join(os.getcwd(), "docs")
+    if not os.path.exists(docs_folder):
+        return None, "No document URL provided and docs folder not found"
+    
+    for filename in os.listdir(docs_folder):
+        if filename.lower().endswith(('.pdf', '.docx', '.txt')):
+            return os.path.join(docs_folder, filename), ""
+    
+    return None, "No document URL provided and no documents found in docs folder"
+
+def _start_logging() -> logging.handlers.QueueListener:
+    """Route log records through a queue so request handlers never block on stream I/O"""
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(settings.LOG_LEVEL.upper())
+    
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    listener.start()
+    return listener
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan context manager"""
-    global query_service
-    
     # Startup
+    log_listener = _start_logging()
     print("🚀 Starting HackRx 6.0 Intelligent Query-Retrieval System...")
-    query_service = QueryService()
+    app.state.http_client = create_http_client()
+    app.state.default_local_doc, app.state.default_local_doc_error = _find_local_doc()
+    app.state.query_service = QueryService(http_client=app.state.http_client)
     
     try:
-        await query_service.initialize()
+        await app.state.query_service.initialize()
         print("✅ All services initialized successfully")
     except Exception as e:
         print(f"❌ Failed to initialize services: {e}")
@@ -33,13 +67,17 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("🔄 Shutting down services...")
+    await app.state.query_service.aclose()
+    await app.state.http_client.aclose()
+    log_listener.stop()
 
 # Create FastAPI app
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
     description="LLM-Powered Intelligent Query-Retrieval System for HackRx 6.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Add CORS middleware
@@ -51,12 +89,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def get_query_service() -> QueryService:
-    """Dependency to get query service instance"""
-    if query_service is None:
+def get_query_service(request: Request) -> QueryService:
+    """Dependency to get query service instance, initialized by the lifespan before serving"""
+    query_service = getattr(request.app.state, "query_service", None)
+    if query_service is None or not query_service.is_initialized:
         raise HTTPException(status_code=503, detail="Service not initialized")
     return query_service
 
+QueryServiceDep = Annotated[QueryService, Depends(get_query_service)]
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -83,11 +124,8 @@ async def root():
         }
     }
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint with Pinecone status"""
-    global query_service
-    
+async def _check_services(query_service: Optional[QueryService]) -> Dict[str, Any]:
+    """Component checks behind /health, including the Pinecone stats round-trip"""
     services_status = {
         "query_service": query_service is not None,
         "embedding_service": query_service.embedding_service.is_initialized if query_service else False,
@@ -95,26 +133,43 @@ async def health_check():
         "pinecone_service": query_service.embedding_service.pinecone_service.is_initialized if query_service else False
     }
     
-    health_status = {
-        "status": "healthy",
-        "timestamp": time.time(),
+    checks = {
+        "status": "healthy" if all(services_status.values()) else "degraded",
         "services": services_status
     }
     
     # Add Pinecone stats if available
     if query_service and query_service.embedding_service.pinecone_service.is_initialized:
-        pinecone_stats = await query_service.embedding_service.pinecone_service.get_index_stats()
-        health_status["pinecone_stats"] = pinecone_stats
+        checks["pinecone_stats"] = await query_service.embedding_service.pinecone_service.get_index_stats()
+    
+    return checks
+
+@app.get("/health")
+async def health_check(request: Request):
+    """Health check endpoint with Pinecone status"""
+    query_service = getattr(request.app.state, "query_service", None)
     
-    if not all(services_status.values()):
-        health_status["status"] = "degraded"
+    # Reuse the component checks within the TTL to avoid a Pinecone round-trip per probe
+    now = time.time()
+    if _health_cache["status"] is None or now - _health_cache["ts"] >= settings.HEALTH_CACHE_TTL:
+        _health_cache["status"] = await _check_services(query_service)
+        _health_cache["ts"] = now
+    
+    checks = _health_cache["status"]
+    health_status = {
+        "status": checks["status"],
+        "timestamp": time.time(),
+        "services": checks["services"]
+    }
+    if "pinecone_stats" in checks:
+        health_status["pinecone_stats"] = checks["pinecone_stats"]
     
     return health_status
 
 @app.post(f"{settings.API_V1_PREFIX}/hackrx/run", response_model=QueryResponse)
 async def process_query(
     request: QueryRequest,
-    service: QueryService = Depends(get_query_service)
+    service: QueryServiceDep
 ):
     """
     Main endpoint for processing document queries
@@ -125,6 +180,10 @@ async def process_query(
     3. Performs similarity search for relevant chunks
     4. Uses LLM (Gemini) to generate contextual answers
     5. Returns structured JSON responses
+    
+    All questions in the request are processed as one batch: they are embedded
+    in a single forward pass and answered concurrently, so clients should send
+    every question for a document in one request rather than one per call.
     """
     try:
         # Validate request
@@ -135,7 +194,7 @@ async def process_query(
             raise HTTPException(status_code=400, detail="At least one question is required")
         
         # Process the query
-        result = await service.process_query(request, include_detailed=False)
+        result = await service.process_query(request, include_detailed=False, batch=True)
         
         return result
         
@@ -150,7 +209,8 @@ async def process_query(
 @app.post("/hackrx/run", response_model=QueryResponse)
 async def process_query_legacy(
     request: LegacyQueryRequest,
-    service: QueryService = Depends(get_query_service)
+    http_request: Request,
+    service: QueryServiceDep
 ):
     """
     Backward-compatible endpoint for legacy request format
@@ -164,30 +224,16 @@ async def process_query_legacy(
     And converts them to the standard format internally.
     """
     try:
-        # If no document_url provided, use local documents from docs folder
+        # If no document_url provided, use the local document resolved at startup
         document_source = request.document_url
         if not document_source:
-            # Use local documents from docs folder
-            import os
-            docs_folder = os.path.join(os.getcwd(), "docs")
-            if os.path.exists(docs_folder):
-                # Find the first document in docs folder
-                for filename in os.listdir(docs_folder):
-                    if filename.lower().endswith(('.pdf', '.docx', '.txt')):
-                        document_source = os.path.join(docs_folder, filename)
-                        print(f"Using local document: {document_source}")
-                        break
-                
-                if not document_source:
-                    raise HTTPException(
-                        status_code=400, 
-                        detail="No document URL provided and no documents found in docs folder"
-                    )
-            else:
+            document_source = http_request.app.state.default_local_doc
+            if not document_source:
                 raise HTTPException(
                     status_code=400, 
-                    detail="No document URL provided and docs folder not found"
+                    detail=http_request.app.state.default_local_doc_error
                 )
+            print(f"Using local document: {document_source}")
         
         # Convert legacy format to standard format
         standard_request = QueryRequest(
@@ -211,7 +257,7 @@ async def process_query_legacy(
 @app.post(f"{settings.API_V1_PREFIX}/hackrx/run/detailed", response_model=QueryResponse)
 async def process_query_detailed(
     request: QueryRequest,
-    service: QueryService = Depends(get_query_service)
+    service: QueryServiceDep
 ):
     """
     Extended endpoint that returns detailed responses including:
@@ -221,7 +267,7 @@ async def process_query_detailed(
     - Token usage statistics
     """
     try:
-        result = await service.process_query(request, include_detailed=True)
+        result = await service.process_query(request, include_detailed=True, batch=True)
         return result
         
     except Exception as e:
@@ -233,7 +279,7 @@ async def process_query_detailed(
 @app.post(f"{settings.API_V1_PREFIX}/analyze-document")
 async def analyze_document(
     document_url: str,
-    service: QueryService = Depends(get_query_service)
+    service: QueryServiceDep
 ):
     """
     Analyze document structure and extract metadata
@@ -251,8 +297,8 @@ async def analyze_document(
 @app.post(f"{settings.API_V1_PREFIX}/summarize-document")
 async def summarize_document(
     document_url: str,
-    max_length: int = 500,
-    service: QueryService = Depends(get_query_service)
+    service: QueryServiceDep,
+    max_length: int = 500
 ):
     """
     Generate a summary of the document
@@ -270,18 +316,17 @@ async def summarize_document(
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler"""
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=500,
         content=ErrorResponse(
             error="Internal Server Error",
             message=str(exc),
             details={"path": str(request.url)}
-        ).dict()
+        ).model_dump()
     )
 
 if __name__ == "__main__":
     import uvicorn
-    import os
     
     port = int(os.getenv("PORT", 8000))
     
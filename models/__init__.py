@@ -1 +1,2 @@
 from .schemas import *
+from .chunk_table import ChunkTable
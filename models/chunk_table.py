@@ -0,0 +1,113 @@
+import numpy as np
+from typing import Iterator, List, Optional, Sequence, Union
+from models.schemas import DocumentChunk
+
+class ChunkTable:
+    """Column-oriented storage for document chunks
+    
+    Keeps chunk fields in parallel columns instead of one pydantic model and
+    metadata dict per chunk. ``DocumentChunk`` instances are only built on
+    access, e.g. when chunks are returned over the API or sent to Pinecone.
+    """
+    
+    __slots__ = ("contents", "page_numbers", "chunk_indices", "word_counts", "token_ids", "embeddings")
+    
+    def __init__(
+        self,
+        contents: Optional[List[str]] = None,
+        page_numbers: Optional[Sequence[int]] = None,
+        chunk_indices: Optional[Sequence[int]] = None,
+        word_counts: Optional[Sequence[int]] = None
+    ):
+        self.contents: List[str] = contents if contents is not None else []
+        count = len(self.contents)
+        # Page numbers are 1-based; 0 marks chunks without a page
+        self.page_numbers = np.asarray(page_numbers if page_numbers is not None else np.zeros(count), dtype=np.int32)
+        self.chunk_indices = np.asarray(chunk_indices if chunk_indices is not None else np.arange(count), dtype=np.int32)
+        self.word_counts = np.asarray(word_counts if word_counts is not None else np.zeros(count), dtype=np.int32)
+        # Embedding-model token ids without special tokens, filled in when a tokenizer is available
+        self.token_ids: Optional[List[List[int]]] = None
+        self.embeddings: Optional[np.ndarray] = None
+    
+    @classmethod
+    def concat(cls, tables: Sequence["ChunkTable"]) -> "ChunkTable":
+        """Join several tables, e.g. the per-page tables of a PDF"""
+        if not tables:
+            return cls()
+        contents = [content for table in tables for content in table.contents]
+        merged = cls(
+            contents,
+            np.concatenate([table.page_numbers for table in tables]),
+            np.concatenate([table.chunk_indices for table in tables]),
+            np.concatenate([table.word_counts for table in tables])
+        )
+        if all(part.token_ids is not None for part in tables):
+            merged.token_ids = [ids for part in tables for ids in part.token_ids]
+        return merged
+    
+    @classmethod
+    def from_models(cls, chunks: Sequence[DocumentChunk]) -> "ChunkTable":
+        """Build a table from DocumentChunk instances"""
+        return cls(
+            [chunk.content for chunk in chunks],
+            [chunk.page_number or 0 for chunk in chunks],
+            [chunk.chunk_index for chunk in chunks],
+            [chunk.metadata.get("word_count", len(chunk.content.split())) for chunk in chunks]
+        )
+    
+    def __len__(self) -> int:
+        return len(self.contents)
+    
+    def __getitem__(self, index: Union[int, slice]) -> Union[DocumentChunk, List[DocumentChunk]]:
+        if isinstance(index, slice):
+            return [self._build_chunk(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        return self._build_chunk(index)
+    
+    def __iter__(self) -> Iterator[DocumentChunk]:
+        for i in range(len(self)):
+            yield self._build_chunk(i)
+    
+    def _build_chunk(self, i: int) -> DocumentChunk:
+        page_number = int(self.page_numbers[i])
+        return DocumentChunk(
+            content=self.contents[i],
+            page_number=page_number or None,
+            chunk_index=int(self.chunk_indices[i]),
+            metadata={"word_count": int(self.word_counts[i])},
+            embedding=self.embeddings[i].tolist() if self.embeddings is not None else None
+        )
+    
+    def to_arrow(self):
+        """Columnar pyarrow.Table of the chunk fields (embeddings live in the vector index)"""
+        import pyarrow as pa
+        
+        columns = {
+            "content": pa.array(self.contents, type=pa.string()),
+            "page_number": pa.array(self.page_numbers),
+            "chunk_index": pa.array(self.chunk_indices),
+            "word_count": pa.array(self.word_counts),
+        }
+        if self.token_ids is not None:
+            columns["token_ids"] = pa.array(self.token_ids, type=pa.list_(pa.int32()))
+        return pa.table(columns)
+    
+    @classmethod
+    def from_arrow(cls, table) -> "ChunkTable":
+        """Rebuild a ChunkTable from the output of to_arrow()"""
+        chunks = cls(
+            table.column("content").to_pylist(),
+            table.column("page_number").to_numpy(),
+            table.column("chunk_index").to_numpy(),
+            table.column("word_count").to_numpy()
+        )
+        if "token_ids" in table.column_names:
+            chunks.token_ids = table.column("token_ids").to_pylist()
+        return chunks
+    
+    def to_models(self) -> List[DocumentChunk]:
+        """Materialize every chunk as a DocumentChunk"""
+        return list(self)
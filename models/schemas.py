@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 from typing import List, Optional, Dict, Any
 from enum import Enum
 
@@ -12,7 +12,8 @@ class QueryRequest(BaseModel):
     documents: str = Field(..., description="URL or path to the document")
     questions: List[str] = Field(..., description="List of questions to answer")
     
-    @validator('questions')
+    @field_validator('questions')
+    @classmethod
     def validate_questions(cls, v):
         if not v or len(v) == 0:
             raise ValueError("At least one question is required")
@@ -26,6 +27,8 @@ class DocumentChunk(BaseModel):
     embedding: Optional[List[float]] = None  # For Pinecone storage
 
 class ClauseMatch(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+    
     content: str
     similarity_score: float
     page_number: Optional[int] = None
@@ -33,12 +36,45 @@ class ClauseMatch(BaseModel):
     metadata: Dict[str, Any] = {}
 
 class AnswerResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+    
     question: str
     answer: str
     confidence_score: float = Field(ge=0.0, le=1.0)
     reasoning: str
     relevant_clauses: List[ClauseMatch]
     token_usage: Dict[str, int] = {}
+    
+    @classmethod
+    def from_error(
+        cls,
+        question: str,
+        error: Exception,
+        relevant_clauses: Optional[List[ClauseMatch]] = None,
+        reasoning: str = "Error occurred during processing"
+    ) -> "AnswerResponse":
+        """Build the fallback answer for a failed question, skipping validation of known-good fields"""
+        return cls.model_construct(
+            question=question,
+            answer=f"Error processing question: {str(error)}",
+            confidence_score=0.0,
+            reasoning=reasoning,
+            relevant_clauses=relevant_clauses or [],
+            token_usage={}
+        )
+
+class LLMAnswer(BaseModel):
+    """Structured answer emitted by Gemini in JSON mode"""
+    answer: str
+    confidence_score: float
+    reasoning: str
+
+class QueryComplexity(BaseModel):
+    """Structured complexity assessment emitted by Gemini in JSON mode"""
+    complexity: int
+    domain: str
+    information_type: str
+    key_terms: List[str]
 
 class QueryResponse(BaseModel):
     answers: List[str] = Field(..., description="List of answers corresponding to input questions")
@@ -52,6 +88,8 @@ class LegacyQueryRequest(BaseModel):
     document_url: Optional[str] = Field(None, description="URL to the document to analyze. If not provided, uses local documents from docs folder")
 
 class ErrorResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+    
     error: str
     message: str
     details: Optional[Dict[str, Any]] = None
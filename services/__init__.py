@@ -1,11 +1,12 @@
 from .document_processor import DocumentProcessor
 from .embedding_service import EmbeddingService
-from .llm_service import LLMService
+from .llm_service import LLMService, get_llm_service
 from .query_service import QueryService
 
 __all__ = [
     "DocumentProcessor",
     "EmbeddingService", 
     "LLMService",
+    "get_llm_service",
     "QueryService"
 ]
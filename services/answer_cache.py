@@ -0,0 +1,71 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+import numpy as np
+import faiss
+from models.schemas import AnswerResponse
+
+class SemanticAnswerCache:
+    """In-process cache of answers keyed by question embedding and retrieved context
+    
+    A question hits when a previous question scored at least ``threshold`` cosine
+    similarity against it and was answered from the same context. Entries expire
+    after ``ttl`` seconds and the least recently used ones are evicted past ``max_entries``.
+    """
+    
+    # Neighbours checked per lookup, so near-duplicates with a different context don't hide a hit
+    _SEARCH_K = 8
+    
+    def __init__(self, dimension: int, max_entries: int = 1024, ttl: float = 600.0, threshold: float = 0.9):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self._index = faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
+        # id -> (context hash, answer, expiry), ordered from least to most recently used
+        self._entries: "OrderedDict[int, Tuple[str, AnswerResponse, float]]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def context_hash(context: str) -> str:
+        return hashlib.blake2b(context.encode(), digest_size=8).hexdigest()
+    
+    def get(self, embedding: np.ndarray, context_hash: str) -> Optional[AnswerResponse]:
+        """Return the cached answer for a near-identical question over the same context"""
+        with self._lock:
+            if not self._entries:
+                return None
+            
+            query = np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1)
+            scores, ids = self._index.search(query, min(self._SEARCH_K, len(self._entries)))
+            now = time.time()
+            for score, entry_id in zip(scores[0], ids[0]):
+                if score < self.threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is None or entry[0] != context_hash:
+                    continue
+                if entry[2] < now:
+                    self._remove(int(entry_id))
+                    continue
+                self._entries.move_to_end(int(entry_id))
+                return entry[1]
+            return None
+    
+    def put(self, embedding: np.ndarray, context_hash: str, answer: AnswerResponse) -> None:
+        """Store an answer, evicting the least recently used entries when full"""
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            vector = np.ascontiguousarray(embedding, dtype=np.float32).reshape(1, -1)
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = (context_hash, answer, time.time() + self.ttl)
+            
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+    
+    def _remove(self, entry_id: int) -> None:
+        self._entries.pop(entry_id, None)
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+class ChunkStore:
+    """Local chunk-text store keyed by Pinecone vector id
+    
+    Lets Pinecone metadata stay small: vectors carry only ids and positions, and
+    the text of the final top-k matches is looked up here in one query.
+    """
+    
+    # SQLite limits the number of bound parameters per statement
+    _LOOKUP_BATCH = 500
+    
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT PRIMARY KEY, content TEXT NOT NULL)")
+        self._conn.commit()
+    
+    def get_many(self, ids: List[str]) -> Dict[str, str]:
+        """Return stored texts for the ids that are present"""
+        found: Dict[str, str] = {}
+        unique_ids = list(dict.fromkeys(ids))
+        with self._lock:
+            for start in range(0, len(unique_ids), self._LOOKUP_BATCH):
+                batch = unique_ids[start:start + self._LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(f"SELECT id, content FROM chunks WHERE id IN ({placeholders})", batch)
+                found.update(rows)
+        return found
+    
+    def put_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        """Store chunk texts, replacing existing entries for the same ids"""
+        rows = list(items)
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks (id, content) VALUES (?, ?)", rows)
+            self._conn.commit()
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,121 +1,484 @@
 import asyncio
 import aiofiles
+import gc
+import hashlib
 import httpx
+import logging
+import numpy as np
+import os
 import ssl
-from typing import List, Optional, Tuple
+import tempfile
+import time
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
 from io import BytesIO
+from urllib.parse import urlparse
+from urllib.request import url2pathname
 import PyPDF2
 from docx import Document
+from lxml import etree
 import re
-from models.schemas import DocumentChunk, DocumentType
+from models.schemas import DocumentType
+from models.chunk_table import ChunkTable
+from utils.text_processing import clean_text
+
+try:
+    import fitz  # PyMuPDF
+    PYMUPDF_AVAILABLE = True
+except ImportError:
+    PYMUPDF_AVAILABLE = False
+    print("⚠️  PyMuPDF not available, falling back to PyPDF2 for PDF extraction")
+
+try:
+    import magic  # python-magic (libmagic bindings)
+    _MAGIC = magic.Magic(mime=True)
+    LIBMAGIC_AVAILABLE = True
+except (ImportError, OSError):
+    # OSError: the bindings are installed but the libmagic shared library is missing
+    LIBMAGIC_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_SENTENCE_BOUNDARY_RE = re.compile(r'(?<=[.!?])\s+')
+
+def _iter_sentences(text: str) -> Iterator[str]:
+    """Lazily yield sentences, equivalent to splitting on sentence-ending punctuation"""
+    start = 0
+    for match in _SENTENCE_BOUNDARY_RE.finditer(text):
+        yield text[start:match.start()]
+        start = match.end()
+    yield text[start:]
+
+_WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_WORD_TEXT_TAGS = (f'{_WORD_NS}t', f'{_WORD_NS}tab', f'{_WORD_NS}p')
+
+def _extract_docx_text(content: bytes) -> str:
+    """Pull paragraph text straight from word/document.xml without building python-docx objects"""
+    paragraphs = []
+    pieces: List[str] = []
+    with zipfile.ZipFile(BytesIO(content)) as archive:
+        with archive.open('word/document.xml') as xml:
+            for _, elem in etree.iterparse(xml, events=('end',), tag=_WORD_TEXT_TAGS):
+                if elem.tag == _WORD_TEXT_TAGS[0]:
+                    if elem.text:
+                        pieces.append(elem.text)
+                elif elem.tag == _WORD_TEXT_TAGS[1]:
+                    pieces.append('\t')
+                else:
+                    paragraph = ''.join(pieces)
+                    if paragraph.strip():
+                        paragraphs.append(paragraph)
+                    pieces = []
+                elem.clear()
+    return '\n'.join(paragraphs)
+
+def _pdf_page_text(doc, page_index: int) -> str:
+    """Plain text of one PDF page; the page object is released before returning"""
+    return doc[page_index].get_text("text")
+
+# Run a GC pass every N pages while streaming large PDFs
+PDF_GC_INTERVAL_PAGES = 50
+
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+
+# Document type lookup tables: leading magic bytes, then content-type marker or extension
+_SIGNATURE_TYPES = {
+    b'%PDF': DocumentType.PDF,
+    b'PK\x03\x04': DocumentType.DOCX,  # ZIP container
+}
+_TYPE_HINTS = (
+    (DocumentType.PDF, 'pdf', '.pdf'),
+    (DocumentType.DOCX, 'wordprocessingml', '.docx'),
+    (DocumentType.TEXT, 'text', '.txt'),
+)
+_MIME_TYPES = {
+    'application/pdf': DocumentType.PDF,
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': DocumentType.DOCX,
+    'application/zip': DocumentType.DOCX,
+}
+# libmagic only inspects the start of the buffer
+MAGIC_SNIFF_BYTES = 4096
+
+def _detect_document_type(content: bytes, path: str, content_type: str = "") -> DocumentType:
+    """Determine document type from magic bytes, falling back to content-type, extension and libmagic"""
+    doc_type = _SIGNATURE_TYPES.get(content[:4])
+    if doc_type is not None:
+        return doc_type
+    
+    extension = os.path.splitext(path)[1].lower()
+    for doc_type, marker, suffix in _TYPE_HINTS:
+        if marker in content_type or extension == suffix:
+            return doc_type
+    
+    # Unlabelled content: let libmagic look for signatures past the first bytes,
+    # e.g. a PDF header preceded by junk, before assuming plain text
+    if LIBMAGIC_AVAILABLE:
+        try:
+            return _MIME_TYPES.get(_MAGIC.from_buffer(content[:MAGIC_SNIFF_BYTES]), DocumentType.TEXT)
+        except Exception:
+            pass
+    return DocumentType.TEXT
+
+# Process-wide cap on in-flight downloads, created lazily from settings
+_download_semaphore: Optional[asyncio.Semaphore] = None
+# Longest Retry-After we are willing to wait on a 429 before the next attempt
+MAX_RETRY_AFTER_SECONDS = 10.0
+
+def _get_download_semaphore() -> asyncio.Semaphore:
+    global _download_semaphore
+    if _download_semaphore is None:
+        from config import settings
+        _download_semaphore = asyncio.Semaphore(settings.MAX_DOWNLOAD_CONCURRENCY)
+    return _download_semaphore
+
+def _retry_after_seconds(response: httpx.Response) -> float:
+    """Seconds to wait from a Retry-After header (delta form), capped; 1s when absent"""
+    try:
+        delay = float(response.headers.get('Retry-After', 1))
+    except ValueError:
+        delay = 1.0
+    return min(max(delay, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+def _local_path(document_url: str) -> str:
+    """Map a file:// URL to a filesystem path; bare paths are returned unchanged"""
+    if document_url.startswith('file://'):
+        return url2pathname(urlparse(document_url).path)
+    return document_url
+
+def create_http_client() -> httpx.AsyncClient:
+    """Create the pooled HTTP/2 client shared by all document downloads"""
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=30.0,
+        follow_redirects=True,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        headers={'User-Agent': USER_AGENT}
+    )
+
+# Bump when the text cleaning or chunking rules change, so cached chunks are rebuilt
+DOC_CACHE_VERSION = 2
 
 class DocumentProcessor:
     """Handles document parsing and text extraction"""
     
-    async def process_document(self, document_url: str) -> Tuple[List[DocumentChunk], DocumentType]:
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None, tokenizer: Optional[Any] = None):
+        # Reuse the application's client when injected, otherwise lazily create our own
+        self._client = http_client
+        self._owns_client = http_client is None
+        
+        # Long-lived fallback clients keyed by download approach, created on first use
+        self._fallback_clients: Dict[str, httpx.AsyncClient] = {}
+        
+        # CPU-bound parsing and chunking run here, leaving the loop's default executor to blocking I/O
+        self._parse_executor: Optional[ThreadPoolExecutor] = None
+        
+        # Embedding-model tokenizer; when set, chunks are tokenized once as they are created
+        self.tokenizer = tokenizer
+        
+        # Processed documents keyed by source, plus last-seen ETags for revalidation
+        self._doc_cache: "OrderedDict[str, Tuple[float, ChunkTable, DocumentType]]" = OrderedDict()
+        self._etags: Dict[str, str] = {}
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Return the shared HTTP client, creating a fallback one on first use"""
+        if self._client is None:
+            self._client = create_http_client()
+        return self._client
+    
+    async def _run_parse(self, func, *args):
+        """Run a CPU-bound parse or chunking call on the dedicated parse pool"""
+        if self._parse_executor is None:
+            from config import settings
+            self._parse_executor = ThreadPoolExecutor(
+                max_workers=settings.WORKER_THREADS or os.cpu_count() or 1, thread_name_prefix="parse"
+            )
+        return await asyncio.get_running_loop().run_in_executor(self._parse_executor, func, *args)
+    
+    def _get_fallback_client(self, approach: str) -> httpx.AsyncClient:
+        """Return the pooled client for a fallback download approach, creating it on first use"""
+        client = self._fallback_clients.get(approach)
+        if client is None:
+            limits = httpx.Limits(max_connections=100, max_keepalive_connections=20)
+            if approach == "legacy_ssl":
+                # Built here rather than in __init__: OP_LEGACY_SERVER_CONNECT needs Python 3.12+,
+                # and a failure must only disable this approach, not the processor
+                ssl_context = ssl.create_default_context()
+                ssl_context.set_ciphers('DEFAULT@SECLEVEL=1')
+                ssl_context.options |= ssl.OP_LEGACY_SERVER_CONNECT
+                client = httpx.AsyncClient(timeout=30.0, verify=ssl_context, follow_redirects=True,
+                                           limits=limits, headers={'User-Agent': USER_AGENT})
+            elif approach == "unverified":
+                client = httpx.AsyncClient(timeout=30.0, verify=False, follow_redirects=True,
+                                           limits=limits, headers={'User-Agent': USER_AGENT})
+            else:
+                client = httpx.AsyncClient(timeout=60.0, limits=limits)
+            self._fallback_clients[approach] = client
+        return client
+    
+    async def aclose(self):
+        """Close the HTTP client if it was created by this processor, all fallback clients and the parse pool"""
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        
+        clients = list(self._fallback_clients.values())
+        self._fallback_clients.clear()
+        for client in clients:
+            await client.aclose()
+        
+        if self._parse_executor is not None:
+            self._parse_executor.shutdown(wait=False)
+            self._parse_executor = None
+    
+    async def process_document(self, document_url: str) -> Tuple[ChunkTable, DocumentType]:
         """Main entry point for document processing"""
+        from config import settings
+        
         try:
+            is_remote = document_url.startswith(('http://', 'https://'))
+            if not is_remote:
+                document_url = _local_path(document_url)
+            cache_key = self._cache_key(document_url, is_remote)
+            
+            # Serve warm documents without downloading or parsing again
+            if settings.ENABLE_CACHE:
+                cached = await self._get_cached_document(document_url, cache_key, is_remote)
+                if cached is not None:
+                    return cached
+            
             # Check if it's a local file or URL
-            if document_url.startswith(('http://', 'https://')):
+            if is_remote:
                 content, doc_type = await self._download_document(document_url)
             else:
                 content, doc_type = await self._read_local_file(document_url)
             
-            # Extract text based on document type
-            if doc_type == DocumentType.PDF:
-                text_chunks = await self._process_pdf(content)
-            elif doc_type == DocumentType.DOCX:
-                text_chunks = await self._process_docx(content)
-            else:
-                text_chunks = await self._process_text(content.decode('utf-8'))
+            content_hash = self._disk_cache_key(content)
+            result = await self._load_from_disk_cache(content_hash) if settings.ENABLE_CACHE else None
             
-            return text_chunks, doc_type
+            if result is None:
+                # Extract text based on document type
+                if doc_type == DocumentType.PDF:
+                    text_chunks = await self._process_pdf(content)
+                elif doc_type == DocumentType.DOCX:
+                    text_chunks = await self._process_docx(content)
+                else:
+                    text_chunks = await self._process_text(content.decode('utf-8'))
+                
+                if self.tokenizer is not None:
+                    text_chunks.token_ids = await self._run_parse(self._tokenize_chunks, text_chunks.contents)
+                
+                result = (text_chunks, doc_type)
+                if settings.ENABLE_CACHE:
+                    await self._save_to_disk_cache(content_hash, result)
+            
+            if settings.ENABLE_CACHE:
+                self._store_cached_document(cache_key, result)
+            
+            return result
             
         except Exception as e:
             raise Exception(f"Document processing failed: {str(e)}")
     
+    def _cache_key(self, document_url: str, is_remote: bool) -> str:
+        """Build the in-memory cache key; local files include mtime so edits invalidate"""
+        if not is_remote:
+            try:
+                document_url = f"{document_url}:{os.stat(document_url).st_mtime}"
+            except OSError:
+                pass
+        return hashlib.sha1(document_url.encode()).hexdigest()
+    
+    async def _get_cached_document(self, url: str, cache_key: str, is_remote: bool) -> Optional[Tuple[ChunkTable, DocumentType]]:
+        """Return a memoized document, revalidating expired remote entries via ETag"""
+        from config import settings
+        
+        entry = self._doc_cache.get(cache_key)
+        if entry is None:
+            return None
+        
+        cached_at, chunks, doc_type = entry
+        if time.time() - cached_at >= settings.CACHE_TTL:
+            etag = self._etags.get(url)
+            if not (is_remote and etag and await self._etag_matches(url, etag)):
+                del self._doc_cache[cache_key]
+                return None
+            self._doc_cache[cache_key] = (time.time(), chunks, doc_type)
+        
+        self._doc_cache.move_to_end(cache_key)
+        return chunks, doc_type
+    
+    def _store_cached_document(self, cache_key: str, result: Tuple[ChunkTable, DocumentType]):
+        """Insert a processed document, evicting the least recently used entry when full"""
+        from config import settings
+        
+        self._doc_cache[cache_key] = (time.time(), *result)
+        self._doc_cache.move_to_end(cache_key)
+        while len(self._doc_cache) > settings.DOC_CACHE_MAX_ENTRIES:
+            self._doc_cache.popitem(last=False)
+    
+    async def _etag_matches(self, url: str, etag: str) -> bool:
+        """Check with a HEAD request whether the remote document is unchanged"""
+        try:
+            response = await self._get_client().head(url, timeout=10.0)
+            return response.is_success and response.headers.get('etag') == etag
+        except Exception:
+            return False
+    
+    def _disk_cache_key(self, content: bytes) -> str:
+        """Key parsed chunks by the document content and every setting that shapes them"""
+        from config import settings
+        
+        digest = hashlib.blake2b(content, digest_size=16)
+        digest.update(f"|v{DOC_CACHE_VERSION}|{settings.MAX_CHUNK_SIZE}|{settings.CHUNK_OVERLAP}".encode())
+        if self.tokenizer is not None:
+            # Cached token ids are only valid for the tokenizer that produced them
+            digest.update(f"|{self.tokenizer.name_or_path}".encode())
+        return digest.hexdigest()
+    
+    async def _load_from_disk_cache(self, content_hash: str) -> Optional[Tuple[ChunkTable, DocumentType]]:
+        """Load previously parsed chunks for identical document content"""
+        from config import settings
+        
+        path = os.path.join(settings.DOC_CACHE_DIR, f"{content_hash}.parquet")
+        try:
+            return await asyncio.to_thread(self._read_disk_cache_entry, path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug("Ignoring unreadable document cache entry %s: %s", path, e)
+            return None
+    
+    @staticmethod
+    def _read_disk_cache_entry(path: str) -> Tuple[ChunkTable, DocumentType]:
+        import pyarrow.parquet as pq
+        
+        table = pq.read_table(path)
+        doc_type = DocumentType(table.schema.metadata[b"doc_type"].decode())
+        # Mark the entry as recently used for eviction
+        os.utime(path)
+        return ChunkTable.from_arrow(table), doc_type
+    
+    async def _save_to_disk_cache(self, content_hash: str, result: Tuple[ChunkTable, DocumentType]):
+        """Persist parsed chunks as Parquet, keyed by the document content and chunking settings"""
+        from config import settings
+        
+        try:
+            await asyncio.to_thread(self._write_disk_cache_entry, settings.DOC_CACHE_DIR, content_hash, result)
+            await asyncio.to_thread(self._prune_disk_cache, settings.DOC_CACHE_DIR, settings.DOC_CACHE_DISK_MAX_ENTRIES)
+        except Exception as e:
+            logger.warning("Failed to write document cache: %s", e)
+    
+    @staticmethod
+    def _write_disk_cache_entry(directory: str, content_hash: str, result: Tuple[ChunkTable, DocumentType]) -> None:
+        import pyarrow.parquet as pq
+        
+        chunks, doc_type = result
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{content_hash}.parquet")
+        table = chunks.to_arrow().replace_schema_metadata({"doc_type": doc_type.value})
+        # Write under a unique temporary name so concurrent readers never see a partial file
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as tmp:
+            pq.write_table(table, tmp, compression="zstd")
+        os.replace(tmp.name, path)
+    
+    @staticmethod
+    def _prune_disk_cache(directory: str, max_entries: int) -> None:
+        """Evict the least recently used entries, and files from older cache formats"""
+        stale: List[str] = []
+        entries: List[Tuple[float, str]] = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                try:
+                    if entry.name.endswith(".pkl"):
+                        stale.append(entry.path)
+                    elif entry.name.endswith(".parquet"):
+                        entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    pass  # Removed by a concurrent prune
+        
+        if len(entries) > max_entries:
+            entries.sort()
+            stale.extend(path for _, path in entries[:len(entries) - max_entries])
+        for path in stale:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    
     async def _download_document(self, url: str) -> Tuple[bytes, DocumentType]:
         """Download document from URL and determine type"""
+        # Local paths and file:// URLs are read directly, never through an HTTP client
+        if not url.startswith(('http://', 'https://')):
+            return await self._read_local_file(_local_path(url))
+        
         # Try multiple approaches to handle different SSL configurations
         approaches = [
+            self._download_with_shared_client,
             self._download_with_ssl_context,
             self._download_without_verification,
             self._download_with_basic_client
         ]
         
         last_error = None
-        for approach in approaches:
-            try:
-                return await approach(url)
-            except Exception as e:
-                last_error = e
-                print(f"Download approach failed: {e}")
-                continue
+        # Bound concurrent downloads process-wide so bursts don't exhaust sockets or trigger 429s
+        async with _get_download_semaphore():
+            for approach in approaches:
+                try:
+                    return await approach(url)
+                except Exception as e:
+                    last_error = e
+                    print(f"Download approach failed: {e}")
+                    # Honour the server's backoff before retrying with the next approach
+                    if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 429:
+                        await asyncio.sleep(_retry_after_seconds(e.response))
+                    continue
         
         # If all approaches failed, raise the last error
         raise Exception(f"Failed to download document after trying all methods: {last_error}")
     
+    async def _download_with_shared_client(self, url: str) -> Tuple[bytes, DocumentType]:
+        """Download with the pooled keep-alive client"""
+        return await self._stream_download(self._get_client(), url)
+    
     async def _download_with_ssl_context(self, url: str) -> Tuple[bytes, DocumentType]:
         """Download with custom SSL context for legacy servers"""
-        ssl_context = ssl.create_default_context()
-        ssl_context.set_ciphers('DEFAULT@SECLEVEL=1')
-        ssl_context.options |= ssl.OP_LEGACY_SERVER_CONNECT
-        
-        async with httpx.AsyncClient(
-            timeout=30.0,
-            verify=ssl_context,
-            follow_redirects=True,
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-        ) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            return self._process_response(response, url)
+        return await self._stream_download(self._get_fallback_client("legacy_ssl"), url)
     
     async def _download_without_verification(self, url: str) -> Tuple[bytes, DocumentType]:
         """Download without SSL verification as fallback"""
-        async with httpx.AsyncClient(
-            timeout=30.0,
-            verify=False,
-            follow_redirects=True,
-            headers={
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            }
-        ) as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            return self._process_response(response, url)
+        return await self._stream_download(self._get_fallback_client("unverified"), url)
     
     async def _download_with_basic_client(self, url: str) -> Tuple[bytes, DocumentType]:
         """Download with basic httpx client configuration"""
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.get(url)
+        return await self._stream_download(self._get_fallback_client("basic"), url, timeout=60.0)
+    
+    async def _stream_download(self, client: httpx.AsyncClient, url: str, timeout: float = 30.0) -> Tuple[bytes, DocumentType]:
+        """Read the response body in fixed-size blocks and join them once
+        
+        The parsers take the whole document as bytes, so the body is held in memory
+        either way; the status is checked before any of it is read.
+        """
+        blocks: List[bytes] = []
+        async with client.stream("GET", url, timeout=timeout) as response:
             response.raise_for_status()
-            return self._process_response(response, url)
+            async for block in response.aiter_bytes(DOWNLOAD_BLOCK_SIZE):
+                blocks.append(block)
+        
+        return self._process_response(response, url, b"".join(blocks))
     
-    def _process_response(self, response: httpx.Response, url: str) -> Tuple[bytes, DocumentType]:
+    def _process_response(self, response: httpx.Response, url: str, content: bytes) -> Tuple[bytes, DocumentType]:
         """Process HTTP response and determine document type"""
-        content = response.content
         content_type = response.headers.get('content-type', '').lower()
         
-        # Determine document type
-        if 'pdf' in content_type or url.lower().endswith('.pdf'):
-            doc_type = DocumentType.PDF
-        elif 'wordprocessingml' in content_type or url.lower().endswith('.docx'):
-            doc_type = DocumentType.DOCX
-        elif 'text' in content_type or url.lower().endswith('.txt'):
-            doc_type = DocumentType.TEXT
-        else:
-            # Try to detect from content
-            if content.startswith(b'%PDF'):
-                doc_type = DocumentType.PDF
-            elif b'PK' in content[:10]:  # ZIP signature for DOCX
-                doc_type = DocumentType.DOCX
-            else:
-                doc_type = DocumentType.TEXT
+        etag = response.headers.get('etag')
+        if etag:
+            self._etags[url] = etag
         
-        return content, doc_type
+        return content, _detect_document_type(content, urlparse(url).path, content_type)
     
     async def _read_local_file(self, file_path: str) -> Tuple[bytes, DocumentType]:
         """Read local file and determine type"""
@@ -123,134 +486,192 @@ class DocumentProcessor:
             async with aiofiles.open(file_path, 'rb') as file:
                 content = await file.read()
             
-            # Determine document type from file extension
-            file_path_lower = file_path.lower()
-            if file_path_lower.endswith('.pdf'):
-                doc_type = DocumentType.PDF
-            elif file_path_lower.endswith('.docx'):
-                doc_type = DocumentType.DOCX
-            elif file_path_lower.endswith('.txt'):
-                doc_type = DocumentType.TEXT
-            else:
-                # Try to detect from content
-                if content.startswith(b'%PDF'):
-                    doc_type = DocumentType.PDF
-                elif b'PK' in content[:10]:  # ZIP signature for DOCX
-                    doc_type = DocumentType.DOCX
-                else:
-                    doc_type = DocumentType.TEXT
-            
-            return content, doc_type
+            return content, _detect_document_type(content, file_path)
             
         except FileNotFoundError:
             raise Exception(f"File not found: {file_path}")
         except Exception as e:
             raise Exception(f"Error reading local file {file_path}: {str(e)}")
     
-    async def _process_pdf(self, content: bytes) -> List[DocumentChunk]:
-        """Extract text from PDF content"""
-        chunks = []
+    async def _process_pdf(self, content: bytes) -> ChunkTable:
+        """Extract text from PDF content and chunk it page by page"""
         try:
-            pdf_file = BytesIO(content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            if PYMUPDF_AVAILABLE:
+                try:
+                    # MuPDF is not thread-safe, so the whole document is streamed in one worker
+                    return await self._run_parse(self._stream_pdf_chunks_pymupdf, content)
+                except Exception as e:
+                    logger.debug("PyMuPDF extraction failed, falling back to PyPDF2: %s", e)
             
-            for page_num, page in enumerate(pdf_reader.pages):
-                text = page.extract_text()
-                if text.strip():
-                    # Split text into chunks
-                    page_chunks = self._create_text_chunks(text, page_num + 1)
-                    chunks.extend(page_chunks)
+            texts = await self._extract_pdf_pages_pypdf2(content)
             
-            return chunks
+            # Split pages into chunks concurrently
+            chunk_lists = await asyncio.gather(*[
+                self._run_parse(self._create_text_chunks, text, page_num + 1)
+                for page_num, text in enumerate(texts) if text.strip()
+            ])
+            return ChunkTable.concat(chunk_lists)
         except Exception as e:
             raise Exception(f"PDF processing error: {str(e)}")
     
-    async def _process_docx(self, content: bytes) -> List[DocumentChunk]:
-        """Extract text from DOCX content"""
-        chunks = []
+    def _stream_pdf_chunks_pymupdf(self, content: bytes) -> ChunkTable:
+        """Extract and chunk one page at a time, prefetching the next page while chunking
+        
+        Every MuPDF call happens on a single dedicated extractor thread, so the
+        document is never touched concurrently while this thread chunks.
+        """
+        page_tables = []
+        with ThreadPoolExecutor(max_workers=1) as extractor:
+            doc = extractor.submit(fitz.open, stream=content, filetype="pdf").result()
+            try:
+                page_count = doc.page_count
+                pending = extractor.submit(_pdf_page_text, doc, 0) if page_count else None
+                for page_num in range(page_count):
+                    text = pending.result()
+                    # Start extracting the next page before chunking this one
+                    if page_num + 1 < page_count:
+                        pending = extractor.submit(_pdf_page_text, doc, page_num + 1)
+                    
+                    if text.strip():
+                        page_tables.append(self._create_text_chunks(text, page_num + 1))
+                    del text
+                    
+                    # Periodically release page objects held in reference cycles
+                    if (page_num + 1) % PDF_GC_INTERVAL_PAGES == 0:
+                        gc.collect()
+            finally:
+                extractor.submit(doc.close).result()
+        
+        return ChunkTable.concat(page_tables)
+    
+    async def _extract_pdf_pages_pypdf2(self, content: bytes) -> List[str]:
+        """Extract per-page text with PyPDF2, spreading page ranges across worker threads"""
+        page_count = await self._run_parse(self._count_pdf_pages, content)
+        if page_count == 0:
+            return []
+        
+        # PdfReader is not thread-safe, so each worker parses its own contiguous page range
+        workers = min(page_count, os.cpu_count() or 1)
+        step = -(-page_count // workers)
+        page_ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        extracted = await asyncio.gather(*[
+            self._run_parse(self._extract_pdf_page_range, content, start, stop)
+            for start, stop in page_ranges
+        ])
+        return [text for page_texts in extracted for text in page_texts]
+    
+    def _count_pdf_pages(self, content: bytes) -> int:
+        """Return the number of pages in the PDF"""
+        return len(PyPDF2.PdfReader(BytesIO(content)).pages)
+    
+    def _extract_pdf_page_range(self, content: bytes, start: int, stop: int) -> List[str]:
+        """CPU-bound PyPDF2 extraction of pages [start, stop), run in a worker thread"""
+        pdf_reader = PyPDF2.PdfReader(BytesIO(content))
+        return [pdf_reader.pages[i].extract_text() or "" for i in range(start, stop)]
+    
+    async def _process_docx(self, content: bytes) -> ChunkTable:
+        """Extract text from DOCX content without blocking the event loop"""
         try:
-            docx_file = BytesIO(content)
-            doc = Document(docx_file)
-            
-            full_text = []
-            for paragraph in doc.paragraphs:
-                if paragraph.text.strip():
-                    full_text.append(paragraph.text)
-            
-            text = '\n'.join(full_text)
-            chunks = self._create_text_chunks(text)
-            
-            return chunks
+            return await self._run_parse(self._docx_sync, content)
         except Exception as e:
             raise Exception(f"DOCX processing error: {str(e)}")
     
-    async def _process_text(self, content: str) -> List[DocumentChunk]:
+    def _docx_sync(self, content: bytes) -> ChunkTable:
+        """Blocking DOCX parse and chunking, run in a worker thread"""
+        try:
+            text = _extract_docx_text(content)
+        except Exception as e:
+            logger.debug("Direct DOCX XML parse failed, falling back to python-docx: %s", e)
+            text = self._docx_text_python_docx(content)
+        return self._create_text_chunks(text)
+    
+    def _docx_text_python_docx(self, content: bytes) -> str:
+        """Paragraph text via python-docx's full object model"""
+        docx_file = BytesIO(content)
+        doc = Document(docx_file)
+        
+        full_text = []
+        for paragraph in doc.paragraphs:
+            if paragraph.text.strip():
+                full_text.append(paragraph.text)
+        
+        return '\n'.join(full_text)
+    
+    async def _process_text(self, content: str) -> ChunkTable:
         """Process plain text content"""
-        return self._create_text_chunks(content)
+        return await self._run_parse(self._create_text_chunks, content)
     
-    def _create_text_chunks(self, text: str, page_number: Optional[int] = None) -> List[DocumentChunk]:
+    def _create_text_chunks(self, text: str, page_number: Optional[int] = None) -> ChunkTable:
         """Split text into manageable chunks"""
         from config import settings
         
         # Clean and normalize text
         text = self._clean_text(text)
         
-        chunks = []
+        # Chunk fields are collected column-wise and packed into a ChunkTable
+        contents: List[str] = []
+        word_counts: List[int] = []
         chunk_size = settings.MAX_CHUNK_SIZE
-        overlap = settings.CHUNK_OVERLAP
-        
-        # Split by sentences to maintain context
-        sentences = re.split(r'(?<=[.!?])\s+', text)
+        overlap_words = settings.CHUNK_OVERLAP // 10  # Approximate word overlap
         
-        current_chunk = ""
-        chunk_index = 0
+        # Accumulate sentence pieces and track the joined length instead of
+        # re-concatenating the growing chunk string on every sentence
+        buf: List[str] = []
+        buf_len = 0
+        buf_words = 0
+        # Rolling window of the last words, used to seed the next chunk's overlap
+        tail: Deque[str] = deque(maxlen=overlap_words)
         
-        for sentence in sentences:
+        # Walk sentences lazily to maintain context without materializing the list
+        for sentence in _iter_sentences(text):
+            sentence_words = sentence.split()
+            
             # Check if adding this sentence would exceed chunk size
-            if len(current_chunk) + len(sentence) > chunk_size and current_chunk:
+            if buf and buf_len + len(sentence) > chunk_size:
                 # Create chunk
-                chunk = DocumentChunk(
-                    content=current_chunk.strip(),
-                    page_number=page_number,
-                    chunk_index=chunk_index,
-                    metadata={"word_count": len(current_chunk.split())}
-                )
-                chunks.append(chunk)
-                chunk_index += 1
+                contents.append(" ".join(buf).strip())
+                word_counts.append(buf_words)
                 
                 # Start new chunk with overlap
-                words = current_chunk.split()
-                if len(words) > overlap // 10:  # Approximate word overlap
-                    overlap_text = ' '.join(words[-(overlap // 10):])
-                    current_chunk = overlap_text + " " + sentence
+                if overlap_words and buf_words > overlap_words:
+                    overlap_text = ' '.join(tail)
+                    buf = [overlap_text, sentence]
+                    buf_len = len(overlap_text) + 1 + len(sentence)
+                    buf_words = len(tail) + len(sentence_words)
                 else:
-                    current_chunk = sentence
+                    tail.clear()
+                    buf = [sentence]
+                    buf_len = len(sentence)
+                    buf_words = len(sentence_words)
+            elif buf:
+                buf.append(sentence)
+                buf_len += 1 + len(sentence)
+                buf_words += len(sentence_words)
             else:
-                if current_chunk:
-                    current_chunk += " " + sentence
-                else:
-                    current_chunk = sentence
+                buf = [sentence]
+                buf_len = len(sentence)
+                buf_words = len(sentence_words)
+            
+            tail.extend(sentence_words)
         
         # Add final chunk
-        if current_chunk.strip():
-            chunk = DocumentChunk(
-                content=current_chunk.strip(),
-                page_number=page_number,
-                chunk_index=chunk_index,
-                metadata={"word_count": len(current_chunk.split())}
-            )
-            chunks.append(chunk)
+        current_chunk = " ".join(buf).strip()
+        if current_chunk:
+            contents.append(current_chunk)
+            word_counts.append(buf_words)
         
-        return chunks
+        return ChunkTable(
+            contents,
+            page_numbers=np.full(len(contents), page_number or 0, dtype=np.int32),
+            word_counts=word_counts
+        )
+    
+    def _tokenize_chunks(self, contents: List[str]) -> List[List[int]]:
+        """Tokenize all chunk texts in one batch call so embedding can skip re-tokenization"""
+        if not contents:
+            return []
+        return self.tokenizer(contents, add_special_tokens=False, return_attention_mask=False)["input_ids"]
     
     def _clean_text(self, text: str) -> str:
-        """Clean and normalize text"""
-        # Remove excessive whitespace
-        text = re.sub(r'\s+', ' ', text)
-        # Remove special characters but keep punctuation
-        text = re.sub(r'[^\w\s\.,!?;:\-\(\)\[\]{}"\']', ' ', text)
-        # Fix spacing around punctuation
-        text = re.sub(r'\s+([,.!?;:])', r'\1', text)
-        text = re.sub(r'([,.!?;:])\s*', r'\1 ', text)
-        
-        return text.strip()
+        """Clean and normalize text; short repeated blocks such as headers and footers are memoized"""
+        return clean_text(text)
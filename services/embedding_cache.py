@@ -0,0 +1,64 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Tuple
+
+class EmbeddingCache:
+    """Persistent chunk-embedding cache keyed by a hash of the chunk text
+    
+    Backed by a single SQLite file so repeated boilerplate and re-ingested
+    documents skip the embedding model entirely.
+    """
+    
+    # SQLite limits the number of bound parameters per statement
+    _LOOKUP_BATCH = 500
+    
+    def __init__(self, path: str, namespace: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        # Keys are scoped by namespace (model + backend) so vectors never mix across models
+        self._namespace = namespace.encode()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key BLOB PRIMARY KEY, vector BLOB NOT NULL)")
+        self._conn.commit()
+    
+    def key(self, text: str) -> bytes:
+        """16-byte BLAKE2b digest of the namespaced chunk text"""
+        digest = hashlib.blake2b(self._namespace, digest_size=16)
+        digest.update(b"\0")
+        digest.update(text.encode())
+        return digest.digest()
+    
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """Return cached vectors for the keys that are present"""
+        found: Dict[bytes, np.ndarray] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique_keys), self._LOOKUP_BATCH):
+                batch = unique_keys[start:start + self._LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                )
+                for key, vector in rows:
+                    found[key] = np.frombuffer(vector, dtype=np.float32)
+        return found
+    
+    def put_many(self, items: Iterable[Tuple[bytes, np.ndarray]]) -> None:
+        """Store vectors, replacing existing entries for the same keys"""
+        rows = [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+            self._conn.commit()
+    
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,11 +1,107 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
 import numpy as np
 import faiss
-from typing import List, Tuple, Optional
+from typing import Callable, Dict, List, Tuple, Optional
 from sentence_transformers import SentenceTransformer
 import os
-import pickle
-from models.schemas import DocumentChunk, ClauseMatch
+from models.schemas import ClauseMatch
+from models.chunk_table import ChunkTable
 from services.pinecone_service import PineconeService
+from services.onnx_embedder import ONNX_AVAILABLE, OnnxEmbedder
+from services.embedding_cache import EmbeddingCache
+
+logger = logging.getLogger(__name__)
+
+# Process-wide embedding model, loaded once and shared by every EmbeddingService
+_MODEL = None
+_MODEL_LOCK = threading.Lock()
+
+def get_model():
+    """Return the configured embedding model, loading it on first use"""
+    global _MODEL
+    with _MODEL_LOCK:
+        if _MODEL is None:
+            _MODEL = _load_model()
+    return _MODEL
+
+def _load_model():
+    from config import settings
+    
+    if settings.EMBEDDING_BACKEND == "onnx" and ONNX_AVAILABLE:
+        return OnnxEmbedder.load(settings.EMBEDDING_MODEL, settings.ONNX_MODEL_DIR, settings.ONNX_QUANTIZE)
+    if settings.EMBEDDING_BACKEND == "onnx":
+        print("⚠️  ONNX Runtime not available, falling back to sentence-transformers")
+    
+    model = SentenceTransformer(settings.EMBEDDING_MODEL)
+    model.eval()
+    # fp16 halves weight memory on GPU; CPU fp16 matmuls are slower than fp32, so keep fp32 there
+    if model.device.type == "cuda":
+        model.half()
+    if settings.EMBEDDING_TORCH_COMPILE:
+        import torch
+        if hasattr(torch, "compile"):
+            model[0].auto_model = torch.compile(model[0].auto_model, mode="reduce-overhead")
+    return model
+
+class _QueryBatcher:
+    """Coalesces single-query encodes that arrive within a short window into one model call"""
+    
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], max_batch: int = 64, max_wait: float = 0.005):
+        self._encode = encode
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+    
+    async def encode(self, query: str) -> np.ndarray:
+        """Return the (1, dim) embedding for a query, batched with concurrent callers"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+        
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((query, future))
+        return await future
+    
+    async def _run(self):
+        """Drain up to max_batch queries or max_wait seconds, then encode them together"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                embeddings = await asyncio.to_thread(self._encode, [query for query, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            
+            for i, (_, future) in enumerate(batch):
+                if not future.done():
+                    future.set_result(embeddings[i:i + 1])
+    
+    async def aclose(self):
+        """Stop the background consumer"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
 
 class EmbeddingService:
     """Handles document embeddings and semantic search using FAISS and Pinecone"""
@@ -16,6 +112,10 @@ class EmbeddingService:
         self.chunks = []
         self.is_initialized = False
         self.pinecone_service = PineconeService()
+        self._query_batcher = _QueryBatcher(self._encode_texts)
+        self.embedding_cache: Optional[EmbeddingCache] = None
+        # LRU of normalized (1, dim) query embeddings keyed by the raw query string
+        self._query_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
     
     async def initialize(self):
         """Initialize the embedding model, FAISS index, and Pinecone"""
@@ -25,11 +125,18 @@ class EmbeddingService:
         from config import settings
         
         try:
-            # Load embedding model
-            self.model = SentenceTransformer(settings.EMBEDDING_MODEL)
+            # Load embedding model (shared by every service instance in this process)
+            self.model = await asyncio.to_thread(get_model)
+            
+            # Persistent per-chunk embedding cache, scoped to the active model
+            if settings.ENABLE_CACHE:
+                self.embedding_cache = EmbeddingCache(
+                    settings.EMBEDDING_CACHE_PATH,
+                    f"{settings.EMBEDDING_MODEL}:{settings.EMBEDDING_BACKEND}"
+                )
             
             # Initialize FAISS index (as fallback)
-            self.index = faiss.IndexFlatIP(settings.EMBEDDING_DIMENSION)  # Inner Product for cosine similarity
+            self.index = self._create_faiss_index()
             
             # Initialize Pinecone service
             await self.pinecone_service.initialize()
@@ -39,24 +146,121 @@ class EmbeddingService:
         except Exception as e:
             raise Exception(f"Failed to initialize embedding service: {str(e)}")
     
-    async def create_embeddings(self, chunks: List[DocumentChunk]) -> np.ndarray:
+    async def create_embeddings(self, chunks: ChunkTable) -> np.ndarray:
         """Create embeddings for document chunks and attach them to chunks"""
         if not self.is_initialized:
             await self.initialize()
         
-        # Extract text content
-        texts = [chunk.content for chunk in chunks]
+        # Encoding runs in a worker thread so the event loop stays responsive
+        embeddings = await asyncio.to_thread(self._encode_chunks, chunks)
+        
+        # Attach embeddings as a column for Pinecone storage
+        chunks.embeddings = embeddings
+        
+        return embeddings
+    
+    def _create_faiss_index(self, num_vectors: int = 0) -> faiss.Index:
+        """Exact inner-product index for small documents, HNSW graph for large ones
+        
+        With FAISS_FP16 the vectors are stored as float16 via a scalar quantizer,
+        halving index memory and scan bandwidth; FAISS_INT8 stores 8-bit codes
+        trained on each document's value ranges, quartering them.
+        """
+        from config import settings
+        
+        dim = settings.EMBEDDING_DIMENSION
+        quantizer_type = None
+        if settings.FAISS_INT8:
+            quantizer_type = faiss.ScalarQuantizer.QT_8bit
+        elif settings.FAISS_FP16:
+            quantizer_type = faiss.ScalarQuantizer.QT_fp16
+        
+        if num_vectors < settings.HNSW_MIN_VECTORS:
+            if quantizer_type is not None:
+                return faiss.IndexScalarQuantizer(dim, quantizer_type, faiss.METRIC_INNER_PRODUCT)
+            return faiss.IndexFlatIP(dim)  # Inner Product for cosine similarity
+        
+        if quantizer_type is not None:
+            index = faiss.IndexHNSWSQ(dim, quantizer_type, settings.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWFlat(dim, settings.HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = settings.HNSW_EF_SEARCH
+        return index
+    
+    def _encode_chunks(self, chunks: ChunkTable) -> np.ndarray:
+        """Embed chunks, encoding only texts missing from the embedding cache"""
+        if self.embedding_cache is None:
+            return self._encode_chunk_rows(chunks, list(range(len(chunks))))
+        
+        from config import settings
+        
+        keys = [self.embedding_cache.key(content) for content in chunks.contents]
+        if not keys:
+            return np.empty((0, settings.EMBEDDING_DIMENSION), dtype=np.float32)
+        
+        vectors = self.embedding_cache.get_many(keys)
+        
+        # Encode each missing text once, even when it repeats within the document
+        missing: Dict[bytes, int] = {}
+        for i, key in enumerate(keys):
+            if key not in vectors:
+                missing.setdefault(key, i)
+        if missing:
+            fresh = dict(zip(missing.keys(), self._encode_chunk_rows(chunks, list(missing.values()))))
+            self.embedding_cache.put_many(fresh.items())
+            vectors.update(fresh)
         
-        # Generate embeddings
-        embeddings = self.model.encode(texts, convert_to_tensor=False, normalize_embeddings=True)
+        logger.debug("Embedding cache: %d/%d chunks reused", len(keys) - len(missing), len(keys))
+        return np.stack([vectors[key] for key in keys]).astype(np.float32, copy=False)
+    
+    def _encode_chunk_rows(self, chunks: ChunkTable, rows: List[int]) -> np.ndarray:
+        """Embed selected chunks, reusing token ids computed when the chunks were created"""
+        if chunks.token_ids is not None:
+            return self._encode_token_ids([chunks.token_ids[i] for i in rows])
+        return self._encode_texts([chunks.contents[i] for i in rows])
+    
+    def _encode_texts(self, texts: List[str]) -> np.ndarray:
+        """Blocking batched encode of raw texts into normalized embeddings"""
+        from config import settings
+        
+        return self.model.encode(
+            texts,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+    
+    def _encode_token_ids(self, token_ids: List[List[int]]) -> np.ndarray:
+        """Embed pre-tokenized chunks, padding per batch instead of re-tokenizing the text"""
+        from config import settings
+        
+        if isinstance(self.model, OnnxEmbedder):
+            return self.model.encode_token_ids(token_ids, settings.EMBEDDING_BATCH_SIZE)
+        
+        import torch
         
-        # Attach embeddings to chunks for Pinecone storage
-        for i, chunk in enumerate(chunks):
-            chunk.embedding = embeddings[i].tolist()
+        tokenizer = self.model.tokenizer
+        max_ids = self.model.max_seq_length - tokenizer.num_special_tokens_to_add()
+        embeddings = np.empty((len(token_ids), self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        
+        # Batch chunks of similar token count together so padding stays small
+        order = np.argsort([len(ids) for ids in token_ids], kind="stable")
+        for start in range(0, len(order), settings.EMBEDDING_BATCH_SIZE):
+            batch = order[start:start + settings.EMBEDDING_BATCH_SIZE]
+            features = tokenizer.pad(
+                [{"input_ids": tokenizer.build_inputs_with_special_tokens(token_ids[i][:max_ids])} for i in batch],
+                return_tensors="pt"
+            )
+            features = {name: tensor.to(self.model.device) for name, tensor in features.items()}
+            with torch.no_grad():
+                output = self.model.forward(features)["sentence_embedding"]
+            embeddings[batch] = torch.nn.functional.normalize(output, p=2, dim=1).cpu().numpy()
         
         return embeddings
     
-    async def build_index(self, chunks: List[DocumentChunk], document_path: str = "", is_local: bool = False) -> None:
+    async def build_index(self, chunks: ChunkTable, document_path: str = "", is_local: bool = False) -> None:
         """Build index from document chunks with Pinecone priority"""
         if not self.is_initialized:
             await self.initialize()
@@ -76,20 +280,79 @@ class EmbeddingService:
         if self.pinecone_service.is_initialized:
             await self.pinecone_service.store_document_chunks(chunks, document_path, is_local)
         
-        # Also add to FAISS as fallback
-        if hasattr(self, 'index') and self.index is not None:
-            self.index.add(embeddings.astype('float32'))
+        # Also add to FAISS as fallback, in a fresh index sized for this document
+        # so vector ids line up with self.chunks
+        self.index = self._create_faiss_index(len(chunks))
+        # No copy when the encoder already produced contiguous float32
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if not self.index.is_trained:
+            self.index.train(vectors)  # Only records value ranges for the 8-bit codes; a no-op for fp16
+        self.index.add(vectors)
         
         print(f"Built index with {len(chunks)} chunks {'(cached in Pinecone)' if self.pinecone_service.is_initialized else '(FAISS only)'}")
     
-    async def search_similar_chunks(self, query: str, top_k: int = 5, prefer_user_docs: bool = True) -> List[ClauseMatch]:
-        """Search for similar document chunks with priority for user documents"""
+    async def encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed a batch of queries in a single forward pass"""
+        if not self.is_initialized:
+            await self.initialize()
+        
+        # Only encode queries that are not in the LRU, each distinct one once
+        embeddings = {query: self._get_cached_query(query) for query in queries}
+        missing = [query for query, embedding in embeddings.items() if embedding is None]
+        if missing:
+            encoded = await asyncio.to_thread(self._encode_texts, missing)
+            for i, query in enumerate(missing):
+                embeddings[query] = encoded[i:i + 1]
+                self._cache_query(query, embeddings[query])
+        
+        return np.vstack([embeddings[query] for query in queries])
+    
+    async def _embed_query(self, query: str) -> np.ndarray:
+        """Return the (1, dim) embedding for a query from the LRU or the micro-batcher"""
+        embedding = self._get_cached_query(query)
+        if embedding is None:
+            embedding = await self._query_batcher.encode(query)
+            self._cache_query(query, embedding)
+        return embedding
+    
+    def _get_cached_query(self, query: str) -> Optional[np.ndarray]:
+        embedding = self._query_cache.get(query)
+        if embedding is not None:
+            self._query_cache.move_to_end(query)
+        return embedding
+    
+    def _cache_query(self, query: str, embedding: np.ndarray):
+        from config import settings
+        
+        self._query_cache[query] = embedding
+        self._query_cache.move_to_end(query)
+        while len(self._query_cache) > settings.QUERY_EMBEDDING_CACHE_SIZE:
+            self._query_cache.popitem(last=False)
+    
+    async def aclose(self):
+        """Stop the background query batcher"""
+        await self._query_batcher.aclose()
+    
+    async def search_similar_chunks(
+        self,
+        query: str,
+        top_k: int = 5,
+        prefer_user_docs: bool = True,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> List[ClauseMatch]:
+        """Search for similar document chunks with priority for user documents
+        
+        A precomputed (1, dim) ``query_embedding`` from ``encode_queries`` skips re-encoding the query.
+        """
         if not self.is_initialized:
             await self.initialize()
         
+        # Encode once up front; both backends share the same normalized vector
+        if query_embedding is None:
+            query_embedding = await self._embed_query(query)
+        
         # Try Pinecone first (with priority system)
         if self.pinecone_service.is_initialized:
-            query_embedding = self.model.encode([query], convert_to_tensor=False, normalize_embeddings=True)
             results = await self.pinecone_service.search_similar_chunks(
                 query_embedding[0].tolist(), 
                 top_k=top_k, 
@@ -100,8 +363,7 @@ class EmbeddingService:
         
         # Fallback to FAISS
         if hasattr(self, 'index') and self.index is not None and self.index.ntotal > 0:
-            query_embedding = self.model.encode([query], convert_to_tensor=False, normalize_embeddings=True)
-            scores, indices = self.index.search(query_embedding.astype('float32'), top_k)
+            scores, indices = self.index.search(np.ascontiguousarray(query_embedding, dtype=np.float32), top_k)
             
             matches = []
             for score, idx in zip(scores[0], indices[0]):
@@ -123,33 +385,55 @@ class EmbeddingService:
         
         return []
     
-    async def get_relevant_context(self, query: str, top_k: int = 3) -> str:
+    async def get_relevant_context(self, query: str, top_k: int = 3, query_embedding: Optional[np.ndarray] = None) -> str:
         """Get relevant context for a query as a single string"""
-        matches = await self.search_similar_chunks(query, top_k)
-        
-        if not matches:
-            return ""
-        
-        # Combine top matches into context
-        context_parts = []
-        for i, match in enumerate(matches):
-            context_parts.append(f"[Context {i+1}] {match.content}")
+        matches = await self.search_similar_chunks(query, top_k, query_embedding=query_embedding)
+        return self._format_context(matches)
+    
+    async def search_with_context(
+        self,
+        query: str,
+        top_k_chunks: int = 8,
+        top_k_context: int = 5,
+        prefer_user_docs: bool = True,
+        query_embedding: Optional[np.ndarray] = None
+    ) -> Tuple[List[ClauseMatch], str]:
+        """Relevant chunks and a context string for a query, from a single search
         
-        return "\n\n".join(context_parts)
+        The context is built from the best ``top_k_context`` of the same matches
+        instead of running a second search.
+        """
+        matches = await self.search_similar_chunks(
+            query,
+            top_k=max(top_k_chunks, top_k_context),
+            prefer_user_docs=prefer_user_docs,
+            query_embedding=query_embedding
+        )
+        return matches[:top_k_chunks], self._format_context(matches[:top_k_context])
+    
+    @staticmethod
+    def _format_context(matches: List[ClauseMatch]) -> str:
+        """Combine matches into one numbered context string"""
+        return "\n\n".join(f"[Context {i+1}] {match.content}" for i, match in enumerate(matches))
     
     def save_index(self, path: str) -> None:
         """Save FAISS index and chunks to disk"""
         if not self.is_initialized or self.index.ntotal == 0:
             return
         
+        chunks = self.chunks if isinstance(self.chunks, ChunkTable) else ChunkTable.from_models(self.chunks or [])
+        # FAISS ids index into the chunk table, so a mismatched pair must never reach disk
+        if len(chunks) != self.index.ntotal:
+            raise ValueError(f"Index holds {self.index.ntotal} vectors but {len(chunks)} chunks")
+        
         os.makedirs(os.path.dirname(path), exist_ok=True)
         
         # Save FAISS index
         faiss.write_index(self.index, f"{path}.faiss")
         
-        # Save chunks
-        with open(f"{path}.chunks", 'wb') as f:
-            pickle.dump(self.chunks, f)
+        # Save chunks as a compressed columnar Parquet file
+        import pyarrow.parquet as pq
+        pq.write_table(chunks.to_arrow(), f"{path}.parquet", compression="zstd")
     
     def load_index(self, path: str) -> bool:
         """Load FAISS index and chunks from disk"""
@@ -157,14 +441,23 @@ class EmbeddingService:
             if not self.is_initialized:
                 return False
             
+            # Pickled chunks from earlier versions are never unpickled; such indexes must be rebuilt
+            if not os.path.exists(f"{path}.parquet") and os.path.exists(f"{path}.chunks"):
+                logger.warning("⚠️  Ignoring legacy pickle index at %s; rebuild it to store chunks as Parquet", path)
+                return False
+            
             # Load FAISS index
             if os.path.exists(f"{path}.faiss"):
+                from config import settings
                 self.index = faiss.read_index(f"{path}.faiss")
+                # efSearch is a query-time parameter and is not persisted
+                if hasattr(self.index, 'hnsw'):
+                    self.index.hnsw.efSearch = settings.HNSW_EF_SEARCH
             
             # Load chunks
-            if os.path.exists(f"{path}.chunks"):
-                with open(f"{path}.chunks", 'rb') as f:
-                    self.chunks = pickle.load(f)
+            if os.path.exists(f"{path}.parquet"):
+                import pyarrow.parquet as pq
+                self.chunks = ChunkTable.from_arrow(pq.read_table(f"{path}.parquet"))
             
             return True
         except Exception:
@@ -173,6 +466,5 @@ class EmbeddingService:
     def clear_index(self):
         """Clear the current index and chunks"""
         if self.is_initialized:
-            from config import settings
-            self.index = faiss.IndexFlatIP(settings.EMBEDDING_DIMENSION)
+            self.index = self._create_faiss_index()
             self.chunks = []
@@ -0,0 +1,112 @@
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Optional
+import httpx
+import orjson
+from google.api_core import exceptions as google_exceptions
+from pydantic import BaseModel
+
+GEMINI_API_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+# JSON-schema types mapped onto Gemini's OpenAPI subset
+_SCHEMA_TYPES = {"string": "STRING", "number": "NUMBER", "integer": "INTEGER", "boolean": "BOOLEAN", "array": "ARRAY", "object": "OBJECT"}
+
+def _to_gemini_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a (flat) pydantic JSON schema into Gemini's responseSchema format"""
+    converted: Dict[str, Any] = {"type": _SCHEMA_TYPES[schema["type"]]}
+    if "items" in schema:
+        converted["items"] = _to_gemini_schema(schema["items"])
+    if "properties" in schema:
+        converted["properties"] = {name: _to_gemini_schema(prop) for name, prop in schema["properties"].items()}
+        converted["propertyOrdering"] = list(schema["properties"])
+        converted["required"] = schema.get("required", [])
+    return converted
+
+def _generation_config(config: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Translate an SDK-style generation config into the REST field names"""
+    if not config:
+        return None
+    
+    rest_config: Dict[str, Any] = {}
+    for key, value in config.items():
+        if key == "response_schema" and isinstance(value, type) and issubclass(value, BaseModel):
+            value = _to_gemini_schema(value.model_json_schema())
+        head, *rest = key.split("_")
+        rest_config[head + "".join(part.title() for part in rest)] = value
+    return rest_config
+
+class GeminiRestModel:
+    """Minimal Gemini client over httpx and orjson, shaped like genai.GenerativeModel
+    
+    Covers only what LLMService uses: text prompts, a system instruction, JSON
+    generation configs, streaming, and token counting. Responses expose ``text``
+    and ``usage_metadata`` like the SDK's, and HTTP errors are raised as the
+    matching google.api_core exceptions so retry handling is shared.
+    """
+    
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        model_name: str,
+        api_key: str,
+        system_instruction: Optional[str] = None,
+        generation_config: Optional[Dict[str, Any]] = None
+    ):
+        self._client = client
+        self._url = f"{GEMINI_API_URL}/models/{model_name}"
+        self._headers = {"x-goog-api-key": api_key, "content-type": "application/json"}
+        self._system_instruction = system_instruction
+        self._generation_config = generation_config
+    
+    def _body(self, prompt: str, generation_config: Optional[Dict[str, Any]]) -> bytes:
+        body: Dict[str, Any] = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if self._system_instruction:
+            body["systemInstruction"] = {"parts": [{"text": self._system_instruction}]}
+        config = _generation_config(generation_config or self._generation_config)
+        if config:
+            body["generationConfig"] = config
+        return orjson.dumps(body)
+    
+    @staticmethod
+    def _raise_for_status(response: httpx.Response, content: bytes) -> None:
+        if response.status_code >= 400:
+            raise google_exceptions.from_http_status(response.status_code, content.decode(errors="replace"))
+    
+    @staticmethod
+    def _parse(payload: Dict[str, Any]) -> SimpleNamespace:
+        candidates = payload.get("candidates") or [{}]
+        parts = candidates[0].get("content", {}).get("parts", [])
+        usage = payload.get("usageMetadata", {})
+        return SimpleNamespace(
+            text="".join(part.get("text", "") for part in parts),
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=usage.get("promptTokenCount"),
+                candidates_token_count=usage.get("candidatesTokenCount")
+            )
+        )
+    
+    async def generate_content_async(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None, stream: bool = False):
+        """Generate a response, or an async iterator of partial responses with ``stream=True``"""
+        body = self._body(prompt, generation_config)
+        if stream:
+            return self._stream(body)
+        
+        response = await self._client.post(f"{self._url}:generateContent", content=body, headers=self._headers)
+        self._raise_for_status(response, response.content)
+        return self._parse(orjson.loads(response.content))
+    
+    async def _stream(self, body: bytes) -> AsyncIterator[SimpleNamespace]:
+        """Server-sent events from streamGenerateContent, one parsed chunk per event"""
+        async with self._client.stream(
+            "POST", f"{self._url}:streamGenerateContent", params={"alt": "sse"}, content=body, headers=self._headers
+        ) as response:
+            if response.status_code >= 400:
+                self._raise_for_status(response, await response.aread())
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    yield self._parse(orjson.loads(line[5:]))
+    
+    async def count_tokens_async(self, text: str) -> SimpleNamespace:
+        body = orjson.dumps({"contents": [{"role": "user", "parts": [{"text": text}]}]})
+        response = await self._client.post(f"{self._url}:countTokens", content=body, headers=self._headers)
+        self._raise_for_status(response, response.content)
+        return SimpleNamespace(total_tokens=orjson.loads(response.content)["totalTokens"])
@@ -1,223 +1,608 @@
+import asyncio
+import datetime
+import hashlib
+import logging
+import random
+import time
+from functools import lru_cache
+from types import MappingProxyType
 import google.generativeai as genai
-from typing import List, Dict, Any, Optional
-import json
+from google.generativeai import caching
+from google.api_core import exceptions as google_exceptions
+from aiolimiter import AsyncLimiter
+import httpx
+from typing import List, Dict, Any, Optional, Tuple
 import re
-from models.schemas import AnswerResponse, ClauseMatch
+from pydantic import ValidationError
+from models.schemas import AnswerResponse, ClauseMatch, LLMAnswer, QueryComplexity
+from services.gemini_rest import GeminiRestModel
 
-class LLMService:
-    """Handles LLM interactions using Google Gemini API"""
-    
-    def __init__(self):
-        self.model = None
-        self.is_initialized = False
-    
-    async def initialize(self):
-        """Initialize the Gemini model"""
-        if self.is_initialized:
-            return
-        
-        from config import settings
-        
-        if not settings.GEMINI_API_KEY:
-            raise Exception("GEMINI_API_KEY not found in environment variables")
-        
-        try:
-            genai.configure(api_key=settings.GEMINI_API_KEY)
-            self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
-            self.is_initialized = True
-        except Exception as e:
-            raise Exception(f"Failed to initialize Gemini model: {str(e)}")
-    
-    async def answer_question(self, question: str, context: str, relevant_chunks: List[ClauseMatch]) -> AnswerResponse:
-        """Generate an answer for a question using context and relevant chunks"""
-        if not self.is_initialized:
-            await self.initialize()
-        
-        # Create the prompt
-        prompt = self._create_answer_prompt(question, context, relevant_chunks)
-        
-        try:
-            # Generate response
-            response = self.model.generate_content(prompt)
-            
-            # Parse the response
-            answer_data = self._parse_llm_response(response.text)
-            
-            # Create structured response
-            return AnswerResponse(
-                question=question,
-                answer=answer_data.get("answer", "Unable to determine answer from provided context."),
-                confidence_score=answer_data.get("confidence_score", 0.5),
-                reasoning=answer_data.get("reasoning", "Analysis based on provided document context."),
-                relevant_clauses=relevant_chunks,
-                token_usage={"input_tokens": len(prompt.split()), "output_tokens": len(response.text.split())}
-            )
-            
-        except Exception as e:
-            # Fallback response
-            return AnswerResponse(
-                question=question,
-                answer=f"Error processing question: {str(e)}",
-                confidence_score=0.0,
-                reasoning="Error occurred during LLM processing",
-                relevant_clauses=relevant_chunks,
-                token_usage={}
-            )
-    
-    def _create_answer_prompt(self, question: str, context: str, relevant_chunks: List[ClauseMatch]) -> str:
-        """Create a structured prompt for question answering with enhanced contextual reasoning"""
-        
-        # Prepare relevant chunks with better context
-        chunk_info = ""
-        if relevant_chunks:
-            chunk_info = "\n".join([
-                f"RELEVANT SECTION {i+1} (Similarity: {chunk.similarity_score:.3f}):\n{chunk.content}\n"
-                for i, chunk in enumerate(relevant_chunks[:5])  # Use top 5 chunks for better context
-            ])
-        
-        # Analyze question type for better prompting
-        question_lower = question.lower()
-        question_type = "general"
-        specific_instructions = ""
-        
-        if any(word in question_lower for word in ["grace period", "waiting period", "period"]):
-            question_type = "time_period"
-            specific_instructions = """
+try:
+    # google-genai SDK, only needed for Gemini Batch Mode
+    from google import genai as genai_sdk
+    GENAI_BATCH_AVAILABLE = True
+except ImportError:
+    GENAI_BATCH_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Sections of the structured answer format, compiled once
+_ANSWER_RE = re.compile(r'ANSWER:\s*(.*?)(?=\n\n|\nCONFIDENCE:|$)', re.DOTALL | re.IGNORECASE)
+_CONF_RE = re.compile(r'CONFIDENCE:\s*([\d.]+)', re.IGNORECASE)
+_REASON_RE = re.compile(r'REASONING:\s*(.*?)(?=\n\n|$)', re.DOTALL | re.IGNORECASE)
+
+# Question-type keywords in priority order; the first type with any match wins
+_QUESTION_TYPE_KEYWORDS = {
+    "time_period": ("grace period", "waiting period", "period"),
+    "definition": ("define", "definition", "what is", "what does", "means"),
+    "coverage": ("cover", "coverage", "included", "benefit", "include", "scope"),
+    "discount": ("discount", "reduction", "deduction", "savings", "rebate", "no claim", "ncd"),
+    "limits": ("limit", "cap", "maximum", "minimum", "threshold", "restriction"),
+    "process": ("process", "procedure", "step", "how to", "method"),
+    "requirements": ("requirement", "criteria", "condition", "eligible", "qualification"),
+}
+_QUESTION_TYPE_RE = re.compile(
+    "|".join(
+        rf"(?P<{qtype}>\b(?:{'|'.join(map(re.escape, words))}))"
+        for qtype, words in _QUESTION_TYPE_KEYWORDS.items()
+    ),
+    re.IGNORECASE
+)
+
+# Read-only so the shared instruction strings cannot be altered at runtime
+_QUESTION_TYPE_INSTRUCTIONS = MappingProxyType({
+    "time_period": """
 SPECIAL FOCUS: This question asks about time periods. Look for:
 - Specific durations (days, months, years)
 - Grace periods, waiting periods, or policy periods
 - Time-based conditions or requirements
-- Exact numerical values with units (e.g., "30 days", "36 months", "2 years")"""
-        
-        elif any(word in question_lower for word in ["define", "definition", "what is", "what does", "means"]):
-            question_type = "definition"
-            specific_instructions = """
+- Exact numerical values with units (e.g., "30 days", "36 months", "2 years")""",
+    "definition": """
 SPECIAL FOCUS: This question asks for a definition. Look for:
 - Formal definitions or explanations
 - Detailed descriptions of terms or concepts
 - Specific criteria or requirements that define something
-- Complete explanations rather than partial mentions"""
-        
-        elif any(word in question_lower for word in ["cover", "coverage", "included", "benefit", "include", "scope"]):
-            question_type = "coverage"
-            specific_instructions = """
+- Complete explanations rather than partial mentions""",
+    "coverage": """
 SPECIAL FOCUS: This question asks about coverage, benefits, or what's included. Look for:
 - What is covered, included, or within scope
 - Specific benefits, services, or features
 - Coverage limits, conditions, or restrictions
 - Eligibility criteria or requirements
-- Services, products, or areas included"""
-        
-        elif any(word in question_lower for word in ["discount", "reduction", "deduction", "savings", "rebate"]):
-            question_type = "discount"
-            specific_instructions = """
+- Services, products, or areas included""",
+    "discount": """
 SPECIAL FOCUS: This question asks about discounts, reductions, or savings. Look for:
 - Discount percentages, amounts, or reductions
 - Conditions for earning discounts or savings
 - Maximum or minimum discount amounts
 - Rebates, deductions, or cost savings
-- Special offers or promotional reductions"""
-        
-        elif any(word in question_lower for word in ["limit", "cap", "maximum", "minimum", "threshold", "restriction"]):
-            question_type = "limits"
-            specific_instructions = """
+- Special offers or promotional reductions""",
+    "limits": """
 SPECIAL FOCUS: This question asks about limits, caps, or restrictions. Look for:
 - Maximum and minimum amounts, quantities, or values
 - Caps, thresholds, or upper/lower bounds
 - Restrictions, limitations, or constraints
 - Specific numerical limits or ranges
-- Conditions that impose limits or restrictions"""
-        
-        elif any(word in question_lower for word in ["process", "procedure", "step", "how to", "method"]):
-            question_type = "process"
-            specific_instructions = """
+- Conditions that impose limits or restrictions""",
+    "process": """
 SPECIAL FOCUS: This question asks about processes or procedures. Look for:
 - Step-by-step procedures or methods
 - Process descriptions and workflows
 - Instructions or guidelines
 - Sequential actions or requirements
-- How-to information and methodologies"""
-        
-        elif any(word in question_lower for word in ["requirement", "criteria", "condition", "eligible", "qualification"]):
-            question_type = "requirements"
-            specific_instructions = """
+- How-to information and methodologies""",
+    "requirements": """
 SPECIAL FOCUS: This question asks about requirements or criteria. Look for:
 - Eligibility criteria and qualifications
 - Required conditions or prerequisites
 - Mandatory requirements or specifications
 - Qualification standards or benchmarks
-- Compliance requirements or conditions"""
+- Compliance requirements or conditions""",
+})
 
-        prompt = f"""You are an expert document analyst specialized in extracting and analyzing information from various types of documents. Your task is to provide precise, accurate answers based strictly on the provided document content.
+# Static part of the answer prompt, sent once as the system instruction (and context-cached when enabled)
+_ANSWER_SYSTEM_PROMPT = """You are an expert document analyst. Answer precisely, strictly from the document content provided (the user's document if provided, otherwise the knowledge base).
 
-DOCUMENT SOURCE: The analysis is based on the user-provided document. If no specific document was provided by the user, information comes from the available knowledge base.
+RULES:
+- Identify exactly what is asked (numbers, dates, conditions, procedures).
+- Search all provided sections, including synonyms, definitions, numbered clauses; cross-reference them.
+- Use only explicitly stated information; quote numbers, percentages, periods, names and terms verbatim; flag anything only implied.
+- Give the main answer first, then all conditions, exceptions and qualifications.
+- Prefer the user's document; say which source the answer comes from.
+- If the information is absent, answer "The provided document does not contain specific information about [topic]" and state what related information IS available.
 
-QUESTION TYPE: {question_type.upper()}
-QUESTION: {question}
+RESPONSE FORMAT (JSON):
+- answer: direct, complete answer with specific details from the document
+- confidence_score: 0.0-1.0; 0.9+ explicitly stated, 0.7-0.8 clearly implied, 0.5-0.6 partial, 0.3-0.4 unclear, 0.0-0.2 not found
+- reasoning: cite the sections, clause numbers, pages or exact text supporting the answer; if not found, what was searched for"""
+
+# One retrieved section inside the per-question prompt
+_SECTION_TEMPLATE = "RELEVANT SECTION {0} (Similarity: {1:.3f}):\n{2}\n"
+
+# Start of the reasoning field in a streamed JSON answer; Gemini emits schema properties in order
+_REASONING_FIELD_RE = re.compile(r',\s*"reasoning"\s*:')
+_SKIPPED_REASONING = "Reasoning not requested; answer returned as soon as it was complete."
 
+# Gemini JSON mode: answers come back as an LLMAnswer object instead of free text
+_ANSWER_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": LLMAnswer}
+_COMPLEXITY_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": QueryComplexity}
+
+# Identifies the cached copy of the system prompt, so edits to it create a fresh cache
+_ANSWER_SYSTEM_PROMPT_HASH = hashlib.blake2b(_ANSWER_SYSTEM_PROMPT.encode(), digest_size=8).hexdigest()
+
+# Per-question part of the answer prompt
+_ANSWER_PROMPT_TEMPLATE = """QUESTION TYPE: {question_type}
+QUESTION: {question}
 {specific_instructions}
 
-DOCUMENT CONTEXT (Document excerpt):
+DOCUMENT CONTEXT:
 {context}
 
-{chunk_info}
+{chunk_info}"""
+
+# Gemini errors worth retrying: throttling (429), overload (503/500) and timeouts
+_RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded
+)
 
-CRITICAL ANALYSIS INSTRUCTIONS:
+# Terminal states of a Gemini batch job
+_BATCH_SUCCEEDED = "JOB_STATE_SUCCEEDED"
+_BATCH_FAILED = ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED")
 
-1. QUESTION UNDERSTANDING:
-   - Break down the question into key components
-   - Identify exactly what information is being requested
-   - Note any specific details needed (numbers, dates, conditions, policies, procedures)
+# genai keeps one process-wide client per service; configure it once so every LLMService shares its channel
+_GENAI_CONFIGURED = False
 
-2. DOCUMENT SEARCH STRATEGY:
-   - Scan ALL provided context for relevant information
-   - Look for exact matches and synonymous terms
-   - Pay special attention to numbered sections, definitions, policy clauses, procedures, and key terms
-   - Cross-reference information across different sections
+def _configure_genai(settings) -> None:
+    """Configure the Gemini SDK once per process, pinned to the multiplexed gRPC transport"""
+    global _GENAI_CONFIGURED
+    if _GENAI_CONFIGURED:
+        return
+    
+    client_options = {"api_endpoint": settings.GEMINI_API_ENDPOINT} if settings.GEMINI_API_ENDPOINT else None
+    genai.configure(api_key=settings.GEMINI_API_KEY, transport=settings.GEMINI_TRANSPORT, client_options=client_options)
+    _GENAI_CONFIGURED = True
+
+def _approx_tokens(text: str) -> int:
+    """Whitespace token estimate without building a list of words"""
+    return text.count(' ') + text.count('\n') + 1
 
-3. ACCURACY REQUIREMENTS:
-   - Use ONLY information explicitly stated in the document
-   - Include specific numbers, percentages, time periods, names, dates exactly as written
-   - Maintain original terminology and phrasing from the document
-   - If information is implied but not explicitly stated, note this clearly
+def _token_usage(prompt: str, response_text: str, usage_metadata=None, static_tokens: int = 0) -> Dict[str, int]:
+    """Gemini's own token counts when the response carries them, else an estimate plus the static prompt's count"""
+    if usage_metadata is not None and getattr(usage_metadata, "prompt_token_count", None):
+        return {
+            "input_tokens": usage_metadata.prompt_token_count,
+            "output_tokens": usage_metadata.candidates_token_count or 0
+        }
+    return {"input_tokens": static_tokens + _approx_tokens(prompt), "output_tokens": _approx_tokens(response_text)}
 
-4. ANSWER COMPLETENESS:
-   - Provide the main answer first
-   - Include all relevant conditions, exceptions, qualifications, or procedures
-   - Mention related information that adds context
-   - State clearly if information is not found in the provided document
+async def _close_stream(response) -> None:
+    """Stop a streaming Gemini response so its connection doesn't keep generating after an early cut"""
+    if hasattr(response, "aclose"):
+        # GeminiRestModel streams are async generators; closing one closes the HTTP response
+        await response.aclose()
+        return
+    # SDK responses wrap the transport's stream call
+    iterator = getattr(response, "_iterator", None)
+    if hasattr(iterator, "cancel"):
+        iterator.cancel()
+    elif hasattr(iterator, "aclose"):
+        await iterator.aclose()
 
-5. DOCUMENT CONTEXT AWARENESS:
-   - If answering from user-provided document: Focus primarily on that document's content
-   - If no user document provided: Use available knowledge base information
-   - Always specify the source of your information when possible
+def _shingles(text: str) -> set:
+    """Word 3-grams of a passage, for near-duplicate detection"""
+    words = text.lower().split()
+    return {tuple(words[i:i + 3]) for i in range(max(len(words) - 2, 1))}
 
-RESPONSE FORMAT:
-ANSWER: [Direct, complete answer with specific details from the document]
+def _dedup_chunks(
+    chunks: List[ClauseMatch],
+    limit: int = 5,
+    threshold: float = 0.85,
+    char_budget: int = 4000
+) -> List[Tuple[ClauseMatch, str]]:
+    """Best-first chunks without near-duplicates, each trimmed to an equal share of the character budget"""
+    kept: List[Tuple[ClauseMatch, set]] = []
+    for chunk in sorted(chunks, key=lambda c: c.similarity_score, reverse=True):
+        shingles = _shingles(chunk.content)
+        if any(len(shingles & other) / len(shingles | other) >= threshold for _, other in kept):
+            continue
+        kept.append((chunk, shingles))
+        if len(kept) == limit:
+            break
+    
+    per_chunk = char_budget // max(len(kept), 1)
+    return [(chunk, chunk.content[:per_chunk]) for chunk, _ in kept]
 
-CONFIDENCE: [Score from 0.0 to 1.0 - Use 0.9+ only when information is explicitly stated, 0.7-0.8 for clear implications, 0.5-0.6 for partial information, 0.3-0.4 when information is unclear, 0.0-0.2 when not found]
+@lru_cache(maxsize=16)
+def _clause_patterns(keywords: Tuple[str, ...]) -> Tuple[re.Pattern, re.Pattern]:
+    """Sentence-with-keyword pattern and bare keyword pattern for a keyword set"""
+    alternation = "|".join(map(re.escape, keywords))
+    return (
+        re.compile(rf"[^.\n]*\b(?:{alternation})\b[^.\n]*[.\n]?", re.IGNORECASE),
+        re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE)
+    )
 
-REASONING: [Detailed explanation citing specific document sections, clause numbers, page references, or exact text that supports your answer. If answer not found, explain what you searched for and why it's not available.]
+def _local_key_clauses(text: str, keywords: List[str], limit: int = 10) -> List[str]:
+    """Distinct keyword-bearing sentences, densest in keywords first"""
+    sentence_re, keyword_re = _clause_patterns(tuple(keywords))
+    sentences = dict.fromkeys(match.group(0).strip() for match in sentence_re.finditer(text))
+    sentences.pop("", None)
+    ranked = sorted(
+        sentences,
+        key=lambda sentence: len(keyword_re.findall(sentence)) / (sentence.count(" ") + 1),
+        reverse=True
+    )
+    return ranked[:limit]
 
-QUALITY CHECKLIST:
-✓ Answer addresses the exact question asked
-✓ All specific details (numbers, dates, conditions, names) are included
-✓ Information is directly from the document text
-✓ Confidence score reflects actual certainty
-✓ Reasoning explains the evidence clearly
-✓ Source of information is clear (user document vs knowledge base)
+def _classify_question(question: str) -> str:
+    """Return the highest-priority question type whose keywords occur in the question"""
+    matched = {match.lastgroup for match in _QUESTION_TYPE_RE.finditer(question)}
+    return next((qtype for qtype in _QUESTION_TYPE_KEYWORDS if qtype in matched), "general")
 
-IMPORTANT: If the specific information requested is not clearly stated in the provided context, respond with "The provided document does not contain specific information about [topic]" and explain what related information IS available. Always prioritize the user's document content when available."""
+class LLMService:
+    """Handles LLM interactions using Google Gemini API"""
+    
+    def __init__(self):
+        self.model = None
+        self.is_initialized = False
+        self._init_lock = asyncio.Lock()
+        # Concurrency and requests-per-minute caps for Gemini calls, set up in initialize()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._rate_limiter: Optional[AsyncLimiter] = None
+        self._batch_client = None
+        # HTTP client for the REST backend (GEMINI_BACKEND=rest)
+        self._http: Optional[httpx.AsyncClient] = None
+        # Model carrying the static answer instructions, optionally backed by a context cache
+        self.answer_model = None
+        self._answer_cache_expires = 0.0
+        # Token count of the static answer instructions, measured once in initialize()
+        self._static_tokens = _approx_tokens(_ANSWER_SYSTEM_PROMPT)
+    
+    async def initialize(self):
+        """Initialize the Gemini model; concurrent first calls wait for a single setup"""
+        if self.is_initialized:
+            return
+        
+        async with self._init_lock:
+            if self.is_initialized:
+                return
+            
+            from config import settings
+            
+            if not settings.GEMINI_API_KEY:
+                raise Exception("GEMINI_API_KEY not found in environment variables")
+            
+            try:
+                self._semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+                self._rate_limiter = AsyncLimiter(settings.LLM_RPM, 60)
+                if settings.GEMINI_BACKEND == "rest":
+                    self._init_rest_models(settings)
+                else:
+                    _configure_genai(settings)
+                    self.model = genai.GenerativeModel(settings.GEMINI_MODEL)
+                    self.answer_model = genai.GenerativeModel(
+                        settings.GEMINI_MODEL,
+                        system_instruction=_ANSWER_SYSTEM_PROMPT,
+                        generation_config=_ANSWER_GENERATION_CONFIG
+                    )
+                if settings.GEMINI_CONTEXT_CACHE and self._http is None:
+                    await asyncio.to_thread(self._load_answer_cache)
+                await self._count_static_tokens()
+                self.is_initialized = True
+            except Exception as e:
+                raise Exception(f"Failed to initialize Gemini model: {str(e)}")
+    
+    def _init_rest_models(self, settings):
+        """Talk to the Gemini REST API directly over a pooled HTTP/2 client"""
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_connections=settings.LLM_MAX_CONCURRENCY * 2, max_keepalive_connections=settings.LLM_MAX_CONCURRENCY),
+            timeout=httpx.Timeout(120.0)
+        )
+        self.model = GeminiRestModel(self._http, settings.GEMINI_MODEL, settings.GEMINI_API_KEY)
+        self.answer_model = GeminiRestModel(
+            self._http,
+            settings.GEMINI_MODEL,
+            settings.GEMINI_API_KEY,
+            system_instruction=_ANSWER_SYSTEM_PROMPT,
+            generation_config=_ANSWER_GENERATION_CONFIG
+        )
+    
+    async def aclose(self):
+        """Close the REST backend's HTTP client and drop the models, so a later initialize() starts fresh"""
+        async with self._init_lock:
+            self.is_initialized = False
+            self.model = None
+            self.answer_model = None
+            self._answer_cache_expires = 0.0
+            if self._http is not None:
+                await self._http.aclose()
+                self._http = None
+    
+    async def answer_question(
+        self,
+        question: str,
+        context: str,
+        relevant_chunks: List[ClauseMatch],
+        need_reasoning: bool = True
+    ) -> AnswerResponse:
+        """Generate an answer for a question using context and relevant chunks
+        
+        With ``need_reasoning=False`` the response is streamed and cut off as soon
+        as the reasoning field starts, so only the answer and confidence are awaited.
+        """
+        if not self.is_initialized:
+            await self.initialize()
+        
+        # Create the prompt
+        prompt = self._create_answer_prompt(question, context, relevant_chunks)
+        
+        try:
+            if not need_reasoning:
+                response_text = await self._generate_answer_only(prompt, await self._get_answer_model())
+                return self._build_answer(question, prompt, response_text, relevant_chunks)
+            
+            # Generate response
+            response = await self._generate(prompt, await self._get_answer_model())
+            
+            return self._build_answer(question, prompt, response.text, relevant_chunks, response.usage_metadata)
+            
+        except Exception as e:
+            return self._error_answer(question, e, relevant_chunks)
+    
+    def _build_answer(
+        self,
+        question: str,
+        prompt: str,
+        response_text: str,
+        relevant_chunks: List[ClauseMatch],
+        usage_metadata=None
+    ) -> AnswerResponse:
+        """Parse raw model output into a structured response"""
+        answer_data = self._parse_llm_response(response_text)
+        
+        return AnswerResponse(
+            question=question,
+            answer=answer_data.get("answer", "Unable to determine answer from provided context."),
+            confidence_score=answer_data.get("confidence_score", 0.5),
+            reasoning=answer_data.get("reasoning", "Analysis based on provided document context."),
+            relevant_clauses=relevant_chunks,
+            token_usage=_token_usage(prompt, response_text, usage_metadata, self._static_tokens)
+        )
+    
+    def _error_answer(self, question: str, error: Exception, relevant_chunks: List[ClauseMatch]) -> AnswerResponse:
+        """Fallback response when the model call fails"""
+        return AnswerResponse.from_error(question, error, relevant_chunks, reasoning="Error occurred during LLM processing")
+    
+    async def answer_questions_batch(
+        self,
+        questions: List[str],
+        contexts: List[str],
+        relevant_chunks: List[List[ClauseMatch]],
+        latency_budget: Optional[float] = None,
+        need_reasoning: bool = True
+    ) -> List[AnswerResponse]:
+        """Answer several questions concurrently, bounded by the concurrency and RPM limits
+        
+        With USE_BATCH_MODE and a latency budget of at least BATCH_MODE_MIN_LATENCY
+        seconds (or none), the questions go to Gemini Batch Mode instead.
+        """
+        from config import settings
+        
+        if not self.is_initialized:
+            await self.initialize()
+        
+        if (settings.USE_BATCH_MODE and GENAI_BATCH_AVAILABLE and questions
+                and (latency_budget is None or latency_budget >= settings.BATCH_MODE_MIN_LATENCY)):
+            try:
+                return await self.answer_questions_offline(questions, contexts, relevant_chunks, latency_budget)
+            except Exception as e:
+                logger.warning("⚠️  Batch mode failed, answering in realtime: %s", e)
+        
+        return await asyncio.gather(*[
+            self.answer_question(question, context, chunks, need_reasoning)
+            for question, context, chunks in zip(questions, contexts, relevant_chunks)
+        ])
+    
+    async def answer_questions_offline(
+        self,
+        questions: List[str],
+        contexts: List[str],
+        relevant_chunks: List[List[ClauseMatch]],
+        timeout: Optional[float] = None
+    ) -> List[AnswerResponse]:
+        """Answer questions through one Gemini Batch Mode job, polling until it completes"""
+        from config import settings
+        
+        if self._batch_client is None:
+            self._batch_client = genai_sdk.Client(api_key=settings.GEMINI_API_KEY)
+        
+        prompts = [
+            self._create_answer_prompt(question, context, chunks)
+            for question, context, chunks in zip(questions, contexts, relevant_chunks)
+        ]
+        job = await asyncio.to_thread(
+            self._batch_client.batches.create,
+            model=settings.GEMINI_MODEL,
+            src=[
+                {
+                    "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+                    "config": {"system_instruction": _ANSWER_SYSTEM_PROMPT, **_ANSWER_GENERATION_CONFIG}
+                }
+                for prompt in prompts
+            ]
+        )
+        
+        # Poll with exponential backoff until the job finishes or the budget runs out
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or settings.BATCH_MODE_MAX_WAIT)
+        delay = 2.0
+        while True:
+            job = await asyncio.to_thread(self._batch_client.batches.get, name=job.name)
+            state = job.state.name
+            if state == _BATCH_SUCCEEDED:
+                break
+            if state in _BATCH_FAILED:
+                raise Exception(f"Batch job {job.name} ended in state {state}")
+            if loop.time() + delay > deadline:
+                await asyncio.to_thread(self._batch_client.batches.cancel, name=job.name)
+                raise Exception(f"Batch job {job.name} did not finish within the latency budget")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60.0)
+        
+        # Inline responses come back in request order
+        answers = []
+        for question, prompt, chunks, item in zip(questions, prompts, relevant_chunks, job.dest.inlined_responses):
+            if item.response is None:
+                answers.append(self._error_answer(question, Exception(str(item.error)), chunks))
+            else:
+                answers.append(self._build_answer(question, prompt, item.response.text, chunks, item.response.usage_metadata))
+        return answers
+    
+    async def _generate(self, prompt: str, model=None, generation_config=None):
+        """Non-blocking Gemini call under the shared concurrency and rate limits"""
+        return await self._with_retries(
+            lambda: (model or self.model).generate_content_async(prompt, generation_config=generation_config)
+        )
+    
+    async def _generate_answer_only(self, prompt: str, model) -> str:
+        """Stream a JSON answer and stop once the trailing reasoning field begins"""
+        async def stream() -> str:
+            response = await model.generate_content_async(prompt, stream=True)
+            try:
+                buffer = ""
+                async for chunk in response:
+                    buffer += chunk.text
+                    cut = _REASONING_FIELD_RE.search(buffer)
+                    if cut:
+                        # answer and confidence_score precede reasoning, so they are already complete
+                        return buffer[:cut.start()] + f', "reasoning": "{_SKIPPED_REASONING}"}}'
+                return buffer
+            finally:
+                # Stop generation before the concurrency slot is released
+                await _close_stream(response)
+        
+        return await self._with_retries(stream)
+    
+    async def _with_retries(self, call):
+        """Run a Gemini call, retrying throttling and transient server errors with full-jitter backoff
+        
+        Every attempt goes back through the semaphore and rate limiter; the backoff
+        sleep happens outside them so waiting calls don't hold a slot.
+        """
+        from config import settings
+        
+        # Always make at least one attempt, whatever LLM_MAX_RETRIES is set to
+        attempts = max(1, settings.LLM_MAX_RETRIES)
+        for attempt in range(attempts):
+            try:
+                async with self._semaphore, self._rate_limiter:
+                    return await call()
+            except _RETRYABLE_ERRORS:
+                if attempt == attempts - 1:
+                    raise
+            await asyncio.sleep(random.uniform(0, min(settings.LLM_RETRY_MAX_DELAY, 0.5 * 2 ** attempt)))
+    
+    async def truncate_to_tokens(self, text: str, max_tokens: int) -> str:
+        """Cut text to roughly max_tokens Gemini tokens, measured with one count_tokens call
+        
+        Text short enough to be under budget at any realistic token density is
+        returned untouched; otherwise the cut point is scaled from the real count.
+        """
+        if len(text) <= max_tokens * 2:
+            return text
+        
+        try:
+            total_tokens = (await self.model.count_tokens_async(text)).total_tokens
+        except Exception:
+            total_tokens = len(text) // 4  # ~4 characters per token for English text
+        if total_tokens <= max_tokens:
+            return text
+        
+        cut = len(text) * max_tokens // total_tokens
+        # Prefer not to split a word
+        space = text.rfind(" ", 0, cut)
+        return text[:space if space > cut // 2 else cut]
+    
+    async def _count_static_tokens(self):
+        """Measure the system prompt once so estimated usage includes it without recounting"""
+        try:
+            self._static_tokens = (await self.model.count_tokens_async(_ANSWER_SYSTEM_PROMPT)).total_tokens
+        except Exception as e:
+            logger.debug("Could not count system prompt tokens, keeping the estimate: %s", e)
+    
+    async def _get_answer_model(self):
+        """Answer model, refreshing the context cache shortly before it expires"""
+        from config import settings
+        
+        if settings.GEMINI_CONTEXT_CACHE and self._answer_cache_expires and time.time() > self._answer_cache_expires - 60:
+            await asyncio.to_thread(self._load_answer_cache)
+        return self.answer_model
+    
+    def _load_answer_cache(self):
+        """Reuse or create the Gemini context cache holding the static answer instructions"""
+        from config import settings
+        
+        display_name = f"hackrx-answer-{_ANSWER_SYSTEM_PROMPT_HASH}"
+        try:
+            cache = next((c for c in caching.CachedContent.list() if c.display_name == display_name), None)
+            if cache is not None:
+                cache.update(ttl=datetime.timedelta(seconds=settings.GEMINI_CONTEXT_CACHE_TTL))
+            else:
+                cache = caching.CachedContent.create(
+                    model=settings.GEMINI_MODEL,
+                    display_name=display_name,
+                    system_instruction=_ANSWER_SYSTEM_PROMPT,
+                    ttl=datetime.timedelta(seconds=settings.GEMINI_CONTEXT_CACHE_TTL)
+                )
+            self.answer_model = genai.GenerativeModel.from_cached_content(
+                cached_content=cache,
+                generation_config=_ANSWER_GENERATION_CONFIG
+            )
+            self._answer_cache_expires = time.time() + settings.GEMINI_CONTEXT_CACHE_TTL
+        except Exception as e:
+            # Caching has a minimum prompt size and needs a versioned model; plain system instructions still work
+            logger.debug("Gemini context cache unavailable, using system instructions: %s", e)
+            self._answer_cache_expires = 0.0
+    
+    def _create_answer_prompt(self, question: str, context: str, relevant_chunks: List[ClauseMatch]) -> str:
+        """Create a structured prompt for question answering with enhanced contextual reasoning"""
+        
+        # Prepare relevant chunks, dropping near-duplicate passages from overlapping windows
+        chunk_info = "\n".join(
+            _SECTION_TEMPLATE.format(i + 1, chunk.similarity_score, content)
+            for i, (chunk, content) in enumerate(_dedup_chunks(relevant_chunks, limit=5))  # Use top 5 chunks for better context
+        )
+        
+        # Classify the question in a single regex pass
+        question_type = _classify_question(question)
+        specific_instructions = _QUESTION_TYPE_INSTRUCTIONS.get(question_type, "")
 
-        return prompt
+        return _ANSWER_PROMPT_TEMPLATE.format_map({
+            "question_type": question_type.upper(),
+            "question": question,
+            "specific_instructions": specific_instructions,
+            "context": context,
+            "chunk_info": chunk_info
+        })
     
     def _parse_llm_response(self, response_text: str) -> Dict[str, Any]:
         """Parse the structured LLM response"""
+        # JSON mode output validates directly; the regex path only handles free-text replies
+        try:
+            answer_data = LLMAnswer.model_validate_json(response_text).model_dump()
+            answer_data["confidence_score"] = max(0.0, min(1.0, answer_data["confidence_score"]))
+            return answer_data
+        except ValidationError:
+            pass
+        
         try:
             # Extract sections using regex
-            answer_match = re.search(r'ANSWER:\s*(.*?)(?=\n\n|\nCONFIDENCE:|$)', response_text, re.DOTALL | re.IGNORECASE)
-            confidence_match = re.search(r'CONFIDENCE:\s*([\d.]+)', response_text, re.IGNORECASE)
-            reasoning_match = re.search(r'REASONING:\s*(.*?)(?=\n\n|$)', response_text, re.DOTALL | re.IGNORECASE)
+            answer_match = _ANSWER_RE.search(response_text)
+            confidence_match = _CONF_RE.search(response_text)
+            reasoning_match = _REASON_RE.search(response_text)
             
             answer = answer_match.group(1).strip() if answer_match else response_text.strip()
             confidence = float(confidence_match.group(1)) if confidence_match else 0.7
@@ -241,15 +626,20 @@ IMPORTANT: If the specific information requested is not clearly stated in the pr
     
     async def extract_key_clauses(self, text: str, domain_keywords: List[str] = None) -> List[str]:
         """Extract key clauses from document text"""
+        domain_keywords = domain_keywords or ["policy", "coverage", "premium", "claim", "benefit", "waiting period", "exclusion"]
+        
+        # Keyword-bearing sentences are found locally; the LLM is only asked when too few turn up
+        clauses = _local_key_clauses(text, domain_keywords)
+        if len(clauses) >= 3:
+            return clauses
+        
         if not self.is_initialized:
             await self.initialize()
         
-        domain_keywords = domain_keywords or ["policy", "coverage", "premium", "claim", "benefit", "waiting period", "exclusion"]
-        
         prompt = f"""Analyze the following document text and extract key clauses related to {', '.join(domain_keywords)}.
 
 TEXT:
-{text[:2000]}  # Limit text to avoid token limits
+{await self.truncate_to_tokens(text, 500)}
 
 Extract the most important clauses, conditions, and policy details. Focus on:
 - Coverage details and limits
@@ -261,7 +651,7 @@ Extract the most important clauses, conditions, and policy details. Focus on:
 Return only the key clauses, one per line."""
 
         try:
-            response = self.model.generate_content(prompt)
+            response = await self._generate(prompt)
             clauses = [line.strip() for line in response.text.split('\n') if line.strip()]
             return clauses[:10]  # Return top 10 clauses
         except Exception:
@@ -280,19 +670,11 @@ Assess:
 1. Complexity level (1-5 scale)
 2. Domain type (insurance/legal/HR/compliance/other)
 3. Required information type (factual/analytical/comparative)
-4. Key terms to search for
-
-Respond in JSON format:
-{{
-    "complexity": 1-5,
-    "domain": "domain_type",
-    "information_type": "type",
-    "key_terms": ["term1", "term2"]
-}}"""
+4. Key terms to search for"""
 
         try:
-            response = self.model.generate_content(prompt)
-            return json.loads(response.text)
+            response = await self._generate(prompt, generation_config=_COMPLEXITY_GENERATION_CONFIG)
+            return QueryComplexity.model_validate_json(response.text).model_dump()
         except Exception:
             return {
                 "complexity": 3,
@@ -300,3 +682,13 @@ Respond in JSON format:
                 "information_type": "factual",
                 "key_terms": question.split()[:5]
             }
+
+# Process-wide LLM service, shared so the SDK is configured and the limits applied once
+_LLM_SERVICE: Optional[LLMService] = None
+
+def get_llm_service() -> LLMService:
+    """Return the shared LLMService, creating it on first use"""
+    global _LLM_SERVICE
+    if _LLM_SERVICE is None:
+        _LLM_SERVICE = LLMService()
+    return _LLM_SERVICE
@@ -0,0 +1,94 @@
+import os
+import numpy as np
+from typing import List
+
+try:
+    import onnxruntime as ort
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+class OnnxEmbedder:
+    """Sentence embedder backed by an exported (optionally int8-quantized) ONNX Runtime session
+    
+    Mirrors the parts of the SentenceTransformer API used by EmbeddingService:
+    mean pooling over the last hidden state followed by L2 normalization.
+    """
+    
+    def __init__(self, session: "ort.InferenceSession", tokenizer, max_seq_length: int = 256):
+        self.session = session
+        self.tokenizer = tokenizer
+        self.max_seq_length = max_seq_length
+        self._input_names = {node.name for node in session.get_inputs()}
+        self._dimension = session.get_outputs()[0].shape[-1]
+    
+    @classmethod
+    def load(cls, model_name: str, model_dir: str, quantize: bool = True) -> "OnnxEmbedder":
+        """Export the model to ONNX on first use, quantize it, and open an inference session"""
+        # Bare sentence-transformers names such as all-MiniLM-L6-v2 live under that organization
+        model_id = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+        model_path = os.path.join(model_dir, "model.onnx")
+        quantized_path = os.path.join(model_dir, "model_quantized.onnx")
+        
+        if not os.path.exists(model_path):
+            ORTModelForFeatureExtraction.from_pretrained(model_id, export=True).save_pretrained(model_dir)
+            AutoTokenizer.from_pretrained(model_id, use_fast=True).save_pretrained(model_dir)
+        if quantize and not os.path.exists(quantized_path):
+            quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+        
+        providers = [p for p in ("CUDAExecutionProvider", "CPUExecutionProvider") if p in ort.get_available_providers()]
+        session = ort.InferenceSession(quantized_path if quantize else model_path, providers=providers)
+        tokenizer = AutoTokenizer.from_pretrained(model_dir, use_fast=True)
+        return cls(session, tokenizer)
+    
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dimension
+    
+    def encode(self, texts: List[str], batch_size: int = 64, normalize_embeddings: bool = True, **kwargs) -> np.ndarray:
+        """Embed raw texts; extra SentenceTransformer keyword arguments are accepted and ignored"""
+        batches = []
+        for start in range(0, len(texts), batch_size):
+            features = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            batches.append(self._run(features, normalize_embeddings))
+        if not batches:
+            return np.empty((0, self._dimension), dtype=np.float32)
+        return np.concatenate(batches)
+    
+    def encode_token_ids(self, token_ids: List[List[int]], batch_size: int = 64) -> np.ndarray:
+        """Embed pre-tokenized texts (ids without special tokens), batching by similar length"""
+        max_ids = self.max_seq_length - self.tokenizer.num_special_tokens_to_add()
+        embeddings = np.empty((len(token_ids), self._dimension), dtype=np.float32)
+        
+        order = np.argsort([len(ids) for ids in token_ids], kind="stable")
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            features = self.tokenizer.pad(
+                [{"input_ids": self.tokenizer.build_inputs_with_special_tokens(token_ids[i][:max_ids])} for i in batch],
+                return_tensors="np"
+            )
+            embeddings[batch] = self._run(features, True)
+        
+        return embeddings
+    
+    def _run(self, features, normalize: bool) -> np.ndarray:
+        """Run the session and mean-pool token embeddings over the attention mask"""
+        inputs = {name: np.asarray(value, dtype=np.int64) for name, value in features.items() if name in self._input_names}
+        if "token_type_ids" in self._input_names and "token_type_ids" not in inputs:
+            inputs["token_type_ids"] = np.zeros_like(inputs["input_ids"])
+        
+        hidden = self.session.run(None, inputs)[0]
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        
+        if normalize:
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.astype(np.float32)
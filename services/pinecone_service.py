@@ -1,18 +1,31 @@
 import os
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
+import functools
+from typing import List, Dict, Any, Optional, Set, Tuple
 import numpy as np
 import hashlib
-import json
+import logging
 from config import settings
-from models.schemas import DocumentChunk, ClauseMatch
+from models.schemas import ClauseMatch
+from models.chunk_table import ChunkTable
+from services.chunk_store import ChunkStore
 
 try:
     from pinecone import Pinecone, ServerlessSpec
     PINECONE_AVAILABLE = True
 except ImportError:
     PINECONE_AVAILABLE = False
-    print("⚠️  Pinecone not available, falling back to FAISS only")
+
+logger = logging.getLogger(__name__)
+
+if not PINECONE_AVAILABLE:
+    logger.warning("⚠️  Pinecone not available, falling back to FAISS only")
+
+@functools.lru_cache(maxsize=4096)
+def _doc_hash_cached(path: str, mtime: Optional[float]) -> str:
+    # Digests must stay identical to what is already stored as Pinecone vector ids
+    key = path if mtime is None else f"{path}:{mtime}"
+    return hashlib.md5(key.encode()).hexdigest()
 
 class PineconeService:
     """Handles Pinecone vector database operations for persistent document storage"""
@@ -23,6 +36,10 @@ class PineconeService:
         self.is_initialized = False
         self.local_docs_namespace = "local_docs"
         self.user_docs_namespace = "user_docs"
+        # (namespace, doc_hash) pairs known to be indexed, so repeat checks skip the network
+        self._known_hashes: Set[Tuple[str, str]] = set()
+        # Local chunk text store, used when PINECONE_LOCAL_CONTENT keeps text out of Pinecone metadata
+        self.chunk_store: Optional[ChunkStore] = None
     
     async def initialize(self):
         """Initialize Pinecone connection"""
@@ -30,11 +47,11 @@ class PineconeService:
             return
         
         if not PINECONE_AVAILABLE:
-            print("⚠️  Pinecone package not available, falling back to FAISS")
+            logger.warning("⚠️  Pinecone package not available, falling back to FAISS")
             return
         
         if not settings.PINECONE_API_KEY:
-            print("⚠️  Pinecone API key not provided, falling back to FAISS")
+            logger.warning("⚠️  Pinecone API key not provided, falling back to FAISS")
             return
         
         try:
@@ -43,16 +60,17 @@ class PineconeService:
             
             # Use the provided endpoint directly if available
             if settings.PINECONE_ENDPOINT:
-                print(f"Using Pinecone endpoint: {settings.PINECONE_ENDPOINT}")
+                logger.info("Using Pinecone endpoint: %s", settings.PINECONE_ENDPOINT)
                 # Connect directly to the index using the endpoint
                 self.index = self.pc.Index(
                     name=settings.PINECONE_INDEX_NAME,
-                    host=settings.PINECONE_ENDPOINT
+                    host=settings.PINECONE_ENDPOINT,
+                    pool_threads=settings.PINECONE_POOL_THREADS
                 )
             else:
                 # Fallback: Check if index exists, create if not
                 if settings.PINECONE_INDEX_NAME not in [index.name for index in self.pc.list_indexes()]:
-                    print(f"Creating Pinecone index: {settings.PINECONE_INDEX_NAME}")
+                    logger.info("Creating Pinecone index: %s", settings.PINECONE_INDEX_NAME)
                     self.pc.create_index(
                         name=settings.PINECONE_INDEX_NAME,
                         dimension=settings.EMBEDDING_DIMENSION,
@@ -66,27 +84,28 @@ class PineconeService:
                     await asyncio.sleep(5)
                 
                 # Connect to index
-                self.index = self.pc.Index(settings.PINECONE_INDEX_NAME)
+                self.index = self.pc.Index(settings.PINECONE_INDEX_NAME, pool_threads=settings.PINECONE_POOL_THREADS)
+            
+            if settings.PINECONE_LOCAL_CONTENT:
+                self.chunk_store = ChunkStore(settings.CHUNK_STORE_PATH)
             
             self.is_initialized = True
-            print("✅ Pinecone initialized successfully")
+            logger.info("✅ Pinecone initialized successfully")
             
         except Exception as e:
-            print(f"❌ Failed to initialize Pinecone: {e}")
-            print("⚠️  Falling back to FAISS for vector storage")
+            logger.error("❌ Failed to initialize Pinecone: %s", e)
+            logger.warning("⚠️  Falling back to FAISS for vector storage")
     
     def _generate_doc_hash(self, file_path: str) -> str:
         """Generate a hash for document to check if it's already processed"""
         if file_path.startswith(('http://', 'https://')):
-            return hashlib.md5(file_path.encode()).hexdigest()
+            return _doc_hash_cached(file_path, None)
         else:
             # For local files, use file path + modification time
             try:
-                stat = os.stat(file_path)
-                content = f"{file_path}:{stat.st_mtime}"
-                return hashlib.md5(content.encode()).hexdigest()
-            except:
-                return hashlib.md5(file_path.encode()).hexdigest()
+                return _doc_hash_cached(file_path, os.stat(file_path).st_mtime)
+            except OSError:
+                return _doc_hash_cached(file_path, None)
     
     async def is_document_indexed(self, document_path: str, is_local: bool = False) -> bool:
         """Check if document is already indexed in Pinecone"""
@@ -96,23 +115,21 @@ class PineconeService:
         try:
             doc_hash = self._generate_doc_hash(document_path)
             namespace = self.local_docs_namespace if is_local else self.user_docs_namespace
+            if (namespace, doc_hash) in self._known_hashes:
+                return True
             
-            # Check if any vectors exist with this document hash
-            query_result = self.index.query(
-                vector=[0.0] * settings.EMBEDDING_DIMENSION,
-                filter={"doc_hash": doc_hash},
-                namespace=namespace,
-                top_k=1,
-                include_metadata=True
-            )
-            
-            return len(query_result.matches) > 0
+            # Fetch the document's first vector by id instead of running an ANN query
+            fetch_result = await asyncio.to_thread(self.index.fetch, ids=[f"{doc_hash}_0"], namespace=namespace)
+            if fetch_result.vectors:
+                self._known_hashes.add((namespace, doc_hash))
+                return True
+            return False
             
         except Exception as e:
-            print(f"Error checking document index status: {e}")
+            logger.error("Error checking document index status: %s", e)
             return False
     
-    async def store_document_chunks(self, chunks: List[DocumentChunk], document_path: str, is_local: bool = False):
+    async def store_document_chunks(self, chunks: ChunkTable, document_path: str, is_local: bool = False):
         """Store document chunks in Pinecone"""
         if not self.is_initialized:
             return
@@ -121,39 +138,62 @@ class PineconeService:
             doc_hash = self._generate_doc_hash(document_path)
             namespace = self.local_docs_namespace if is_local else self.user_docs_namespace
             
-            # Prepare vectors for upsert
+            # Prepare vectors for upsert straight from the chunk columns
             vectors = []
-            for i, chunk in enumerate(chunks):
-                vector_id = f"{doc_hash}_{i}"
-                metadata = {
-                    "doc_hash": doc_hash,
-                    "document_path": document_path,
-                    "chunk_index": chunk.chunk_index,
-                    "content": chunk.content,
-                    "page_number": chunk.page_number,
-                    "is_local": is_local,
-                    **chunk.metadata
-                }
-                
-                # Assuming chunks already have embeddings, if not we'll need to generate them
-                if hasattr(chunk, 'embedding') and chunk.embedding is not None:
+            local_contents = []
+            # Assuming chunks already have embeddings, if not we'll need to generate them
+            if chunks.embeddings is not None:
+                for i, content in enumerate(chunks.contents):
+                    vector_id = f"{doc_hash}_{i}"
+                    metadata = {
+                        "doc_hash": doc_hash,
+                        "document_path": document_path,
+                        "chunk_index": int(chunks.chunk_indices[i]),
+                        "page_number": int(chunks.page_numbers[i]) or None,
+                        "is_local": is_local,
+                        "word_count": int(chunks.word_counts[i])
+                    }
+                    # Text goes either into the local chunk store or into the vector's metadata
+                    if self.chunk_store is not None:
+                        local_contents.append((vector_id, content))
+                    else:
+                        metadata["content"] = content
+                    
                     vectors.append({
                         "id": vector_id,
-                        "values": chunk.embedding,
+                        "values": chunks.embeddings[i].tolist(),
                         "metadata": metadata
                     })
             
+            if local_contents:
+                await asyncio.to_thread(self.chunk_store.put_many, local_contents)
+            
             if vectors:
-                # Upsert in batches
+                # Upsert in batches of 100, several requests in flight at once
                 batch_size = 100
-                for i in range(0, len(vectors), batch_size):
-                    batch = vectors[i:i + batch_size]
-                    self.index.upsert(vectors=batch, namespace=namespace)
+                semaphore = asyncio.Semaphore(settings.PINECONE_UPSERT_CONCURRENCY)
+                await asyncio.gather(*[
+                    self._upsert_batch(vectors[i:i + batch_size], namespace, semaphore)
+                    for i in range(0, len(vectors), batch_size)
+                ])
                 
-                print(f"✅ Stored {len(vectors)} chunks in Pinecone namespace '{namespace}'")
+                self._known_hashes.add((namespace, doc_hash))
+                logger.info("✅ Stored %d chunks in Pinecone namespace '%s'", len(vectors), namespace)
             
         except Exception as e:
-            print(f"Error storing chunks in Pinecone: {e}")
+            logger.error("Error storing chunks in Pinecone: %s", e)
+    
+    async def _upsert_batch(self, batch: List[Dict[str, Any]], namespace: str, semaphore: asyncio.Semaphore, max_retries: int = 5):
+        """Upsert one batch off the event loop, backing off exponentially when rate limited"""
+        async with semaphore:
+            for attempt in range(max_retries):
+                try:
+                    await asyncio.to_thread(self.index.upsert, vectors=batch, namespace=namespace)
+                    return
+                except Exception as e:
+                    if getattr(e, "status", None) != 429 or attempt == max_retries - 1:
+                        raise
+                    await asyncio.sleep(0.5 * 2 ** attempt)
     
     async def search_similar_chunks(
         self, 
@@ -168,82 +208,72 @@ class PineconeService:
         try:
             results = []
             
+            # Query both namespaces concurrently, off the event loop
+            namespace_k = top_k if prefer_user_docs else top_k // 2
+            user_results, local_results = await asyncio.gather(
+                self._query_namespace(query_embedding, self.user_docs_namespace, namespace_k),
+                self._query_namespace(query_embedding, self.local_docs_namespace, namespace_k)
+            )
+            
+            local_matches = local_results.matches
             if prefer_user_docs:
-                # First search in user documents (higher priority)
-                user_results = self.index.query(
-                    vector=query_embedding,
-                    namespace=self.user_docs_namespace,
-                    top_k=top_k,
-                    include_metadata=True
-                )
-                
-                for match in user_results.matches:
-                    results.append(ClauseMatch(
-                        content=match.metadata.get("content", ""),
-                        similarity_score=float(match.score),
-                        page_number=match.metadata.get("page_number"),
-                        chunk_index=match.metadata.get("chunk_index", 0),
-                        metadata={
-                            **match.metadata,
-                            "source_priority": "user_document",
-                            "source_type": "external"
-                        }
-                    ))
-                
-                # If we don't have enough results, search local docs
-                if len(results) < top_k:
-                    remaining_k = top_k - len(results)
-                    local_results = self.index.query(
-                        vector=query_embedding,
-                        namespace=self.local_docs_namespace,
-                        top_k=remaining_k,
-                        include_metadata=True
-                    )
-                    
-                    for match in local_results.matches:
-                        results.append(ClauseMatch(
-                            content=match.metadata.get("content", ""),
-                            similarity_score=float(match.score) * 0.8,  # Lower priority for local docs
-                            page_number=match.metadata.get("page_number"),
-                            chunk_index=match.metadata.get("chunk_index", 0),
-                            metadata={
-                                **match.metadata,
-                                "source_priority": "local_document",
-                                "source_type": "local"
-                            }
-                        ))
-            else:
-                # Search both namespaces equally
-                for namespace in [self.user_docs_namespace, self.local_docs_namespace]:
-                    results_ns = self.index.query(
-                        vector=query_embedding,
-                        namespace=namespace,
-                        top_k=top_k // 2,
-                        include_metadata=True
-                    )
-                    
-                    for match in results_ns.matches:
-                        priority_multiplier = 1.0 if namespace == self.user_docs_namespace else 0.8
-                        results.append(ClauseMatch(
-                            content=match.metadata.get("content", ""),
-                            similarity_score=float(match.score) * priority_multiplier,
-                            page_number=match.metadata.get("page_number"),
-                            chunk_index=match.metadata.get("chunk_index", 0),
-                            metadata={
-                                **match.metadata,
-                                "source_priority": "user_document" if namespace == self.user_docs_namespace else "local_document",
-                                "source_type": "external" if namespace == self.user_docs_namespace else "local"
-                            }
-                        ))
+                # Local docs only fill whatever the user documents leave open
+                local_matches = local_matches[:max(top_k - len(user_results.matches), 0)]
+            
+            # Rescore all matches as one array and only build ClauseMatch objects for the winners
+            matches = list(user_results.matches) + list(local_matches)
+            if not matches or top_k <= 0:
+                return []
+            num_user = len(user_results.matches)
+            scores = np.fromiter((match.score for match in matches), dtype=np.float64, count=len(matches))
+            scores[num_user:] *= 0.8  # Lower priority for local docs
+            
+            winners = np.arange(len(matches))
+            if top_k < len(matches):
+                winners = np.argpartition(-scores, top_k - 1)[:top_k]
+            # Highest score first; ties keep user documents ahead, as the stable list sort did
+            winners = winners[np.lexsort((winners, -scores[winners]))]
             
-            # Sort by similarity score (already accounts for priority)
-            results.sort(key=lambda x: x.similarity_score, reverse=True)
-            return results[:top_k]
+            # Text of vectors stored without content metadata is looked up for the winners only
+            stored_contents = {}
+            if self.chunk_store is not None:
+                missing_ids = [matches[i].id for i in winners if "content" not in matches[i].metadata]
+                if missing_ids:
+                    stored_contents = await asyncio.to_thread(self.chunk_store.get_many, missing_ids)
+            
+            for i in winners:
+                match = matches[i]
+                is_user = i < num_user
+                metadata = dict(match.metadata)
+                content = metadata.get("content") or stored_contents.get(match.id, "")
+                page_number = metadata.get("page_number")
+                metadata["source_priority"] = "user_document" if is_user else "local_document"
+                metadata["source_type"] = "external" if is_user else "local"
+                # Trusted internal data, so skip validation; Pinecone returns numeric metadata as floats
+                results.append(ClauseMatch.model_construct(
+                    content=content,
+                    similarity_score=float(scores[i]),
+                    page_number=int(page_number) if page_number is not None else None,
+                    chunk_index=int(metadata.get("chunk_index", 0)),
+                    metadata=metadata
+                ))
+            
+            return results
             
         except Exception as e:
-            print(f"Error searching Pinecone: {e}")
+            logger.error("Error searching Pinecone: %s", e)
             return []
     
+    async def _query_namespace(self, query_embedding: List[float], namespace: str, top_k: int):
+        """Run one blocking Pinecone query in a worker thread"""
+        return await asyncio.to_thread(
+            self.index.query,
+            vector=query_embedding,
+            namespace=namespace,
+            top_k=top_k,
+            include_metadata=True
+        )
+    
     async def clear_user_documents(self):
         """Clear all user-uploaded documents from Pinecone"""
         if not self.is_initialized:
@@ -251,9 +281,10 @@ class PineconeService:
         
         try:
             self.index.delete(delete_all=True, namespace=self.user_docs_namespace)
-            print("✅ Cleared all user documents from Pinecone")
+            self._known_hashes = {key for key in self._known_hashes if key[0] != self.user_docs_namespace}
+            logger.info("✅ Cleared all user documents from Pinecone")
         except Exception as e:
-            print(f"Error clearing user documents: {e}")
+            logger.error("Error clearing user documents: %s", e)
     
     async def get_index_stats(self) -> Dict[str, Any]:
         """Get statistics about the Pinecone index"""
@@ -1,18 +1,56 @@
 import asyncio
+import logging
+import re
 import time
-from typing import List, Dict, Any
+import httpx
+import numpy as np
+from typing import List, Dict, Any, Optional, Tuple
 from services.document_processor import DocumentProcessor
 from services.embedding_service import EmbeddingService
-from services.llm_service import LLMService
-from models.schemas import QueryRequest, QueryResponse, AnswerResponse
+from services.llm_service import get_llm_service
+from services.answer_cache import SemanticAnswerCache
+from models.schemas import QueryRequest, QueryResponse, AnswerResponse, ClauseMatch
+
+logger = logging.getLogger(__name__)
+
+# Cache-key suffix for answers generated without reasoning
+_BRIEF_SUFFIX = ":brief"
+
+# Context focus banners by question keywords, in priority order
+_CONTEXT_FOCUS_KEYWORDS = {
+    "time": ("period", "time", "days", "months", "years"),
+    "definition": ("define", "definition", "what is", "means"),
+    "limits": ("limit", "sub-limit", "cap", "maximum"),
+}
+_BANNER_50 = "=" * 50
+_BANNER_30 = "=" * 30
+_SECTIONS_HEADER = f"\n{_BANNER_50}\nMOST RELEVANT DOCUMENT SECTIONS:\n{_BANNER_50}"
+_CONTEXT_FOCUS_BANNERS = {
+    "time": f"\n{_BANNER_30}\nTIME-RELATED INFORMATION FOCUS\n{_BANNER_30}",
+    "definition": f"\n{_BANNER_30}\nDEFINITION AND EXPLANATION FOCUS\n{_BANNER_30}",
+    "limits": f"\n{_BANNER_30}\nLIMITS AND RESTRICTIONS FOCUS\n{_BANNER_30}",
+}
+_CONTEXT_FOCUS_RE = re.compile(
+    "|".join(
+        rf"(?P<{focus}>{'|'.join(map(re.escape, words))})"
+        for focus, words in _CONTEXT_FOCUS_KEYWORDS.items()
+    ),
+    re.IGNORECASE
+)
+
+def _context_focus(question: str) -> Optional[str]:
+    """Banner for the highest-priority focus whose keywords occur in the question"""
+    matched = {match.lastgroup for match in _CONTEXT_FOCUS_RE.finditer(question)}
+    return next((_CONTEXT_FOCUS_BANNERS[focus] for focus in _CONTEXT_FOCUS_KEYWORDS if focus in matched), None)
 
 class QueryService:
     """Main service that orchestrates document processing, embedding search, and LLM answering"""
     
-    def __init__(self):
-        self.document_processor = DocumentProcessor()
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self.document_processor = DocumentProcessor(http_client)
         self.embedding_service = EmbeddingService()
-        self.llm_service = LLMService()
+        self.llm_service = get_llm_service()
+        self.answer_cache: Optional[SemanticAnswerCache] = None
         self.is_initialized = False
     
     async def initialize(self):
@@ -20,14 +58,42 @@ class QueryService:
         if self.is_initialized:
             return
         
+        from config import settings
+        
         await asyncio.gather(
             self.embedding_service.initialize(),
             self.llm_service.initialize()
         )
+        
+        if settings.ENABLE_CACHE:
+            self.answer_cache = SemanticAnswerCache(
+                settings.EMBEDDING_DIMENSION,
+                max_entries=settings.ANSWER_CACHE_SIZE,
+                ttl=settings.ANSWER_CACHE_TTL,
+                threshold=settings.ANSWER_CACHE_THRESHOLD
+            )
+        
+        # Share the embedding model's fast tokenizer so chunks are tokenized only once
+        if settings.PRETOKENIZE_CHUNKS:
+            self.document_processor.tokenizer = self.embedding_service.model.tokenizer
+        
         self.is_initialized = True
     
-    async def process_query(self, request: QueryRequest, include_detailed: bool = False) -> QueryResponse:
-        """Main entry point for processing queries"""
+    async def aclose(self):
+        """Release network resources held by the services"""
+        await self.document_processor.aclose()
+        await self.embedding_service.aclose()
+        await self.llm_service.aclose()
+    
+    async def process_query(self, request: QueryRequest, include_detailed: bool = False, batch: bool = True) -> QueryResponse:
+        """Main entry point for processing queries
+        
+        With ``batch=True`` all questions are embedded in one forward pass before
+        retrieval. Context is retrieved for every question, then all answers are
+        generated as one concurrency-limited batch.
+        """
+        from config import settings
+        
         start_time = time.time()
         
         try:
@@ -39,44 +105,79 @@ class QueryService:
             prefer_user_docs = not is_local_doc  # Prefer user docs when processing external documents
             
             # Step 1: Process document
-            print(f"Processing document: {request.documents}")
+            logger.debug("Processing document: %s", request.documents)
             chunks, doc_type = await self.document_processor.process_document(request.documents)
-            print(f"Extracted {len(chunks)} chunks from {doc_type} document")
+            logger.debug("Extracted %d chunks from %s document", len(chunks), doc_type)
             
             # Step 2: Build embeddings index with document info
-            print("Building embeddings index...")
+            logger.debug("Building embeddings index...")
             await self.embedding_service.build_index(chunks, request.documents, is_local_doc)
             
             # Step 3: Process each question
-            print(f"Processing {len(request.questions)} questions...")
+            logger.debug("Processing %d questions...", len(request.questions))
             answers = []
             detailed_responses = []
             total_tokens = 0
             
-            # Process questions with some concurrency but limit to avoid rate limits
-            semaphore = asyncio.Semaphore(3)  # Max 3 concurrent questions
+            # Embed every question at once instead of one encode call per question
+            question_embeddings = None
+            if batch:
+                question_embeddings = await self.embedding_service.encode_queries(request.questions)
             
-            async def process_single_question(question: str) -> tuple:
-                async with semaphore:
-                    return await self._answer_single_question(question, prefer_user_docs)
+            # Retrieve context for every question first
+            retrievals = await asyncio.gather(*[
+                self._retrieve_context(
+                    question,
+                    prefer_user_docs,
+                    question_embeddings[i:i + 1] if question_embeddings is not None else None
+                )
+                for i, question in enumerate(request.questions)
+            ], return_exceptions=True)
             
-            # Execute questions
-            tasks = [process_single_question(q) for q in request.questions]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            # Then answer them as one batch; the LLM service bounds concurrency and rate
+            results: List[Any] = list(retrievals)
+            retrieved = [i for i, result in enumerate(retrievals) if not isinstance(result, Exception)]
+            
+            # Without detailed responses the reasoning is never shown, so answers can stop streaming early
+            need_reasoning = include_detailed or not settings.STREAM_EARLY_ANSWER
+            
+            # Repeat questions over the same context are served from the semantic answer cache
+            context_hashes = {}
+            if self.answer_cache is not None and question_embeddings is not None:
+                pending = []
+                for i in retrieved:
+                    context_hashes[i] = self.answer_cache.context_hash(retrievals[i][1])
+                    cached = self.answer_cache.get(question_embeddings[i], context_hashes[i])
+                    if cached is None and not need_reasoning:
+                        cached = self.answer_cache.get(question_embeddings[i], context_hashes[i] + _BRIEF_SUFFIX)
+                    if cached is None:
+                        pending.append(i)
+                    else:
+                        cached = cached.model_copy(update={"question": request.questions[i], "token_usage": {}})
+                        results[i] = (cached.answer, cached)
+                retrieved = pending
+            
+            batch_answers = await self.llm_service.answer_questions_batch(
+                [request.questions[i] for i in retrieved],
+                [retrievals[i][1] for i in retrieved],
+                [retrievals[i][0] for i in retrieved],
+                latency_budget=settings.REQUEST_TIMEOUT,
+                need_reasoning=need_reasoning
+            )
+            for i, detailed_response in zip(retrieved, batch_answers):
+                results[i] = (detailed_response.answer, detailed_response)
+                # Only successful model answers are worth reusing
+                if i in context_hashes and detailed_response.token_usage:
+                    # Answers without reasoning are kept apart so detailed requests never receive them
+                    key = context_hashes[i] if need_reasoning else context_hashes[i] + _BRIEF_SUFFIX
+                    self.answer_cache.put(question_embeddings[i], key, detailed_response)
             
             # Process results
             for i, result in enumerate(results):
                 if isinstance(result, Exception):
                     # Handle failed question
-                    answer = f"Error processing question: {str(result)}"
-                    detailed_response = AnswerResponse(
-                        question=request.questions[i],
-                        answer=answer,
-                        confidence_score=0.0,
-                        reasoning="Error occurred during processing",
-                        relevant_clauses=[],
-                        token_usage={}
-                    )
+                    detailed_response = AnswerResponse.from_error(request.questions[i], result)
+                    answer = detailed_response.answer
                 else:
                     answer, detailed_response = result
                 
@@ -110,76 +211,44 @@ class QueryService:
                 processing_time=time.time() - start_time
             )
     
-    async def _answer_single_question(self, question: str, prefer_user_docs: bool = True) -> tuple:
-        """Process a single question and return answer + detailed response"""
-        try:
-            # Step 1: Enhanced context retrieval with priority system
-            
-            # Get relevant chunks using semantic search with priority
-            relevant_chunks = await self.embedding_service.search_similar_chunks(
-                question, 
-                top_k=8, 
-                prefer_user_docs=prefer_user_docs
-            )
-            
-            # Get broader context for better understanding
-            extended_context = await self.embedding_service.get_relevant_context(question, top_k=5)
-            
-            # Create comprehensive context combining multiple approaches
-            comprehensive_context = self._create_comprehensive_context(question, relevant_chunks, extended_context)
-            
-            # Step 2: Use enhanced LLM prompt to generate answer
-            detailed_response = await self.llm_service.answer_question(question, comprehensive_context, relevant_chunks)
-            
-            return detailed_response.answer, detailed_response
-            
-        except Exception as e:
-            error_response = AnswerResponse(
-                question=question,
-                answer=f"Error processing question: {str(e)}",
-                confidence_score=0.0,
-                reasoning="Error occurred during question processing",
-                relevant_clauses=[],
-                token_usage={}
-            )
-            return error_response.answer, error_response
+    async def _retrieve_context(self, question: str, prefer_user_docs: bool = True, query_embedding: Optional[np.ndarray] = None) -> Tuple[List[ClauseMatch], str]:
+        """Retrieve the relevant chunks and build the LLM context for a single question"""
+        # Enhanced context retrieval with priority system
+        
+        # One semantic search yields both the relevant chunks and the broader context
+        relevant_chunks, extended_context = await self.embedding_service.search_with_context(
+            question,
+            top_k_chunks=8,
+            top_k_context=5,
+            prefer_user_docs=prefer_user_docs,
+            query_embedding=query_embedding
+        )
+        
+        # Create comprehensive context combining multiple approaches
+        comprehensive_context = self._create_comprehensive_context(question, relevant_chunks, extended_context)
+        
+        return relevant_chunks, comprehensive_context
     
     def _create_comprehensive_context(self, question: str, relevant_chunks: List, extended_context: str) -> str:
         """Create comprehensive context for better LLM reasoning"""
         
-        # Analyze question to determine what type of information to prioritize
-        question_lower = question.lower()
-        
         # Start with extended context
         context_parts = [extended_context]
         
-        # Add specific relevant chunks with clear separation
-        if relevant_chunks:
-            context_parts.append("\n" + "="*50)
-            context_parts.append("MOST RELEVANT DOCUMENT SECTIONS:")
-            context_parts.append("="*50)
-            
-            for i, chunk in enumerate(relevant_chunks[:5]):
-                context_parts.append(f"\nSECTION {i+1} (Relevance: {chunk.similarity_score:.3f}):")
-                context_parts.append(f"{chunk.content}")
-                if chunk.page_number:
-                    context_parts.append(f"[Page: {chunk.page_number}]")
+        # Add specific relevant chunks with clear separation, skipping any the extended context already carries
+        extra_chunks = [chunk for chunk in relevant_chunks[:5] if chunk.content not in extended_context]
+        if extra_chunks:
+            context_parts.append(_SECTIONS_HEADER)
+            context_parts.extend(
+                f"\nSECTION {i+1} (Relevance: {chunk.similarity_score:.3f}):\n{chunk.content}"
+                + (f"\n[Page: {chunk.page_number}]" if chunk.page_number else "")
+                for i, chunk in enumerate(extra_chunks)
+            )
         
-        # Add keyword-based context enhancement
-        if any(word in question_lower for word in ["period", "time", "days", "months", "years"]):
-            context_parts.append("\n" + "="*30)
-            context_parts.append("TIME-RELATED INFORMATION FOCUS")
-            context_parts.append("="*30)
-            
-        elif any(word in question_lower for word in ["define", "definition", "what is", "means"]):
-            context_parts.append("\n" + "="*30)
-            context_parts.append("DEFINITION AND EXPLANATION FOCUS")
-            context_parts.append("="*30)
-            
-        elif any(word in question_lower for word in ["limit", "sub-limit", "cap", "maximum"]):
-            context_parts.append("\n" + "="*30)
-            context_parts.append("LIMITS AND RESTRICTIONS FOCUS")
-            context_parts.append("="*30)
+        # Add keyword-based context enhancement, classified in a single regex pass
+        focus = _context_focus(question)
+        if focus:
+            context_parts.append(focus)
         
         return "\n".join(context_parts)
     
@@ -188,12 +257,12 @@ class QueryService:
         try:
             chunks, doc_type = await self.document_processor.process_document(document_url)
             
-            # Basic analysis
-            total_words = sum(len(chunk.content.split()) for chunk in chunks)
-            pages = set(chunk.page_number for chunk in chunks if chunk.page_number)
+            # Basic analysis, read from the chunk columns
+            total_words = int(chunks.word_counts.sum())
+            pages = set(chunks.page_numbers[chunks.page_numbers > 0].tolist())
             
             # Extract key terms using LLM
-            sample_text = " ".join([chunk.content for chunk in chunks[:3]])  # First 3 chunks
+            sample_text = " ".join(chunks.contents[:3])  # First 3 chunks
             key_clauses = await self.llm_service.extract_key_clauses(sample_text)
             
             return {
@@ -217,12 +286,12 @@ class QueryService:
             chunks, _ = await self.document_processor.process_document(document_url)
             
             # Get first few chunks for summary
-            sample_text = " ".join([chunk.content for chunk in chunks[:5]])
+            sample_text = " ".join(chunks.contents[:5])
             
             # Create summary prompt
             prompt = f"""Provide a concise summary of this document (max {max_length} characters):
 
-{sample_text[:2000]}
+{await self.llm_service.truncate_to_tokens(sample_text, 500)}
 
 Focus on:
 - Document type and purpose
@@ -230,7 +299,7 @@ Focus on:
 - Important terms and conditions
 - Main benefits or provisions"""
 
-            response = await self.llm_service.model.generate_content(prompt)
+            response = await self.llm_service.model.generate_content_async(prompt)
             summary = response.text[:max_length]
             
             return summary
@@ -0,0 +1,76 @@
+import numpy as np
+import pyarrow.parquet as pq
+from models.chunk_table import ChunkTable
+
+def _table() -> ChunkTable:
+    return ChunkTable(["first chunk", "second one here", "third"], [1, 1, 2], [0, 1, 0], [2, 3, 1])
+
+def test_concat_keeps_columns_and_token_ids():
+    left, right = _table(), ChunkTable(["fourth"], [3], [0], [1])
+    left.token_ids = [[1, 2], [3, 4, 5], [6]]
+    right.token_ids = [[7]]
+    
+    merged = ChunkTable.concat([left, right])
+    
+    assert merged.contents == ["first chunk", "second one here", "third", "fourth"]
+    assert merged.page_numbers.tolist() == [1, 1, 2, 3]
+    assert merged.chunk_indices.tolist() == [0, 1, 0, 0]
+    assert merged.word_counts.tolist() == [2, 3, 1, 1]
+    assert merged.token_ids == [[1, 2], [3, 4, 5], [6], [7]]
+
+def test_concat_drops_token_ids_unless_every_part_has_them():
+    tokenized = _table()
+    tokenized.token_ids = [[1], [2], [3]]
+    
+    assert ChunkTable.concat([tokenized, _table()]).token_ids is None
+    assert len(ChunkTable.concat([])) == 0
+
+def test_getitem_and_slicing_build_document_chunks():
+    table = ChunkTable(["a", "b c", "d"], [0, 2, 2], [0, 1, 2], [1, 2, 1])
+    
+    assert table[1].content == "b c"
+    assert table[1].page_number == 2
+    assert table[1].metadata == {"word_count": 2}
+    # Page 0 marks chunks without a page
+    assert table[0].page_number is None
+    assert table[-1].chunk_index == 2
+    assert [chunk.content for chunk in table[1:]] == ["b c", "d"]
+    assert [chunk.content for chunk in table[::-2]] == ["d", "a"]
+    
+    try:
+        table[3]
+    except IndexError:
+        pass
+    else:
+        raise AssertionError("expected IndexError")
+
+def test_arrow_round_trip_through_parquet(tmp_path):
+    table = _table()
+    table.token_ids = [[101, 102], [103], []]
+    path = tmp_path / "chunks.parquet"
+    
+    pq.write_table(table.to_arrow(), path, compression="zstd")
+    restored = ChunkTable.from_arrow(pq.read_table(path))
+    
+    assert restored.contents == table.contents
+    assert restored.page_numbers.dtype == np.int32
+    assert restored.page_numbers.tolist() == [1, 1, 2]
+    assert restored.chunk_indices.tolist() == [0, 1, 0]
+    assert restored.word_counts.tolist() == [2, 3, 1]
+    assert restored.token_ids == [[101, 102], [103], []]
+
+def test_arrow_round_trip_without_token_ids():
+    restored = ChunkTable.from_arrow(_table().to_arrow())
+    
+    assert restored.token_ids is None
+    assert [chunk.model_dump() for chunk in restored] == [chunk.model_dump() for chunk in _table()]
+
+def test_from_models_inverts_to_models():
+    table = _table()
+    
+    restored = ChunkTable.from_models(table.to_models())
+    
+    assert restored.contents == table.contents
+    assert restored.page_numbers.tolist() == table.page_numbers.tolist()
+    assert restored.chunk_indices.tolist() == table.chunk_indices.tolist()
+    assert restored.word_counts.tolist() == table.word_counts.tolist()
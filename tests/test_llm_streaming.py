@@ -0,0 +1,80 @@
+import asyncio
+import httpx
+import orjson
+from aiolimiter import AsyncLimiter
+from services.gemini_rest import GeminiRestModel
+from services.llm_service import LLMService, _SKIPPED_REASONING
+
+# A JSON answer split the way Gemini streams it, with the reasoning arriving last
+_EVENTS = ['{"answer": "30 days", ', '"confidence_score": 0.9', ', "reasoning": "The policy ', 'states a grace period ', 'of thirty days."}']
+
+class _SSEStream(httpx.AsyncByteStream):
+    """Server-sent events body that records how far it was read and whether it was closed"""
+    
+    def __init__(self):
+        self.sent = 0
+        self.closed = False
+    
+    async def __aiter__(self):
+        for text in _EVENTS:
+            self.sent += 1
+            payload = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+            yield b"data: " + orjson.dumps(payload) + b"\r\n\r\n"
+    
+    async def aclose(self):
+        self.closed = True
+
+class _SDKStreamCall:
+    """Stands in for the transport stream call wrapped by an SDK streaming response"""
+    
+    def __init__(self):
+        self.cancelled = False
+    
+    def cancel(self):
+        self.cancelled = True
+
+class _SDKResponse:
+    def __init__(self):
+        self._iterator = _SDKStreamCall()
+    
+    async def __aiter__(self):
+        for text in _EVENTS:
+            yield type("Chunk", (), {"text": text})()
+
+class _SDKModel:
+    def __init__(self):
+        self.response = _SDKResponse()
+    
+    async def generate_content_async(self, prompt, stream=False):
+        return self.response
+
+def _service() -> LLMService:
+    service = LLMService()
+    service._semaphore = asyncio.Semaphore(1)
+    service._rate_limiter = AsyncLimiter(1000)
+    return service
+
+def test_rest_stream_closed_after_early_cut():
+    body = _SSEStream()
+    
+    async def run():
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, stream=body))
+        async with httpx.AsyncClient(transport=transport) as client:
+            model = GeminiRestModel(client, "gemini-test", "key")
+            text = await _service()._generate_answer_only("question", model)
+            # Checked before the client closes, which would close the body anyway
+            return text, body.closed
+    
+    text, closed_on_return = asyncio.run(run())
+    
+    assert orjson.loads(text) == {"answer": "30 days", "confidence_score": 0.9, "reasoning": _SKIPPED_REASONING}
+    assert closed_on_return
+    assert body.sent < len(_EVENTS)
+
+def test_sdk_stream_cancelled_after_early_cut():
+    model = _SDKModel()
+    
+    text = asyncio.run(_service()._generate_answer_only("question", model))
+    
+    assert orjson.loads(text)["reasoning"] == _SKIPPED_REASONING
+    assert model.response._iterator.cancelled
@@ -0,0 +1,67 @@
+import asyncio
+from types import SimpleNamespace
+from services.pinecone_service import PineconeService
+
+def _match(match_id: str, score: float, **metadata):
+    metadata.setdefault("content", match_id)
+    return SimpleNamespace(id=match_id, score=score, metadata=metadata)
+
+class _Index:
+    """Returns fixed matches per namespace, truncated to the requested top_k"""
+    
+    def __init__(self, namespaces):
+        self.namespaces = namespaces
+        self.requested = {}
+    
+    def query(self, vector, namespace, top_k, include_metadata):
+        self.requested[namespace] = top_k
+        return SimpleNamespace(matches=self.namespaces.get(namespace, [])[:top_k])
+
+def _service(user, local) -> PineconeService:
+    service = PineconeService()
+    service.index = _Index({service.user_docs_namespace: user, service.local_docs_namespace: local})
+    service.is_initialized = True
+    return service
+
+def _search(service, top_k, prefer_user_docs=True):
+    return asyncio.run(service.search_similar_chunks([0.0], top_k=top_k, prefer_user_docs=prefer_user_docs))
+
+def test_local_matches_fill_remaining_slots_at_reduced_score():
+    service = _service(
+        user=[_match("u1", 0.7, page_number=2.0, chunk_index=4.0), _match("u2", 0.5)],
+        local=[_match("l1", 0.9), _match("l2", 0.6), _match("l3", 0.4)]
+    )
+    
+    results = _search(service, top_k=3)
+    
+    # Only one local slot is left after the two user matches; its score is scaled by 0.8
+    assert [r.content for r in results] == ["l1", "u1", "u2"]
+    assert [r.similarity_score for r in results] == [0.9 * 0.8, 0.7, 0.5]
+    assert [r.metadata["source_type"] for r in results] == ["local", "external", "external"]
+    assert results[1].page_number == 2
+    assert results[1].chunk_index == 4
+
+def test_ties_keep_user_documents_first():
+    service = _service(user=[_match("u1", 0.8)], local=[_match("l1", 1.0)])
+    
+    results = _search(service, top_k=2)
+    
+    assert [r.content for r in results] == ["u1", "l1"]
+    assert results[0].similarity_score == results[1].similarity_score
+
+def test_top_k_selects_highest_scores_across_namespaces():
+    service = _service(
+        user=[_match("u1", 0.3), _match("u2", 0.2)],
+        local=[_match("l1", 0.95), _match("l2", 0.9), _match("l3", 0.1)]
+    )
+    
+    results = _search(service, top_k=4, prefer_user_docs=False)
+    
+    assert service.index.requested == {service.user_docs_namespace: 2, service.local_docs_namespace: 2}
+    assert [r.content for r in results] == ["l1", "l2", "u1", "u2"]
+    assert [r.metadata["source_priority"] for r in results] == [
+        "local_document", "local_document", "user_document", "user_document"
+    ]
+
+def test_no_matches_returns_empty():
+    assert _search(_service(user=[], local=[]), top_k=5) == []
@@ -0,0 +1,50 @@
+import pytest
+from config import settings
+from services.document_processor import DocumentProcessor
+from utils.text_processing import split_text_smartly
+
+_TEXT = "The grace period is thirty days. Premiums are paid yearly. Claims need a form. Cover starts at once."
+
+@pytest.fixture
+def chunk_settings(monkeypatch):
+    def apply(max_chunk_size: int, chunk_overlap: int):
+        monkeypatch.setattr(settings, "MAX_CHUNK_SIZE", max_chunk_size)
+        monkeypatch.setattr(settings, "CHUNK_OVERLAP", chunk_overlap)
+    return apply
+
+def test_chunks_carry_word_overlap(chunk_settings):
+    # CHUNK_OVERLAP // 10 = 2 words are repeated at the start of each following chunk
+    chunk_settings(40, 20)
+    
+    table = DocumentProcessor()._create_text_chunks(_TEXT, 3)
+    
+    assert table.contents == [
+        "The grace period is thirty days.",
+        "thirty days. Premiums are paid yearly.",
+        "paid yearly. Claims need a form.",
+        "a form. Cover starts at once.",
+    ]
+    assert table.page_numbers.tolist() == [3, 3, 3, 3]
+    assert table.chunk_indices.tolist() == [0, 1, 2, 3]
+    assert table.word_counts.tolist() == [6, 6, 6, 6]
+
+def test_overlap_under_one_word_carries_nothing(chunk_settings):
+    chunk_settings(40, 5)
+    
+    table = DocumentProcessor()._create_text_chunks(_TEXT)
+    
+    assert table.contents == [
+        "The grace period is thirty days.",
+        "Premiums are paid yearly.",
+        "Claims need a form. Cover starts at once.",
+    ]
+    assert table.page_numbers.tolist() == [0, 0, 0]
+    assert table.word_counts.tolist() == [6, 4, 8]
+
+@pytest.mark.parametrize("chunk_overlap", [5, 20])
+def test_matches_split_text_smartly(chunk_settings, chunk_overlap):
+    chunk_settings(40, chunk_overlap)
+    
+    table = DocumentProcessor()._create_text_chunks(_TEXT)
+    
+    assert table.contents == split_text_smartly(_TEXT, 40, overlap=chunk_overlap)
@@ -7,6 +7,7 @@ __all__ = [
     "is_valid_url",
     "split_text_smartly",
     "calculate_similarity_score",
+    "calculate_similarity_scores",
     "format_processing_time",
     "extract_numbers_and_dates",
     "truncate_text"
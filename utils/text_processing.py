@@ -1,60 +1,121 @@
+import functools
 import re
 import hashlib
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Union
 from urllib.parse import urlparse
+import numpy as np
 
-def clean_text(text: str) -> str:
-    """Clean and normalize text content"""
+try:
+    import hyperscan
+    HYPERSCAN_AVAILABLE = True
+except ImportError:
+    HYPERSCAN_AVAILABLE = False
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_SPECIAL_CHARS_RE = re.compile(r'[^\w\s\.,!?;:\-\(\)\[\]{}"\']')
+_PUNCT_SPACING_RE = re.compile(r'\s*([,.!?;:])\s*')
+# ASCII fast path for _SPECIAL_CHARS_RE: one C-level translate instead of a regex walk
+_SPECIAL_CHARS_ASCII_TABLE = str.maketrans({
+    chr(code): ' ' for code in range(128) if _SPECIAL_CHARS_RE.match(chr(code))
+})
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+
+# Only short inputs are memoized to bound the caches' memory footprint
+TEXT_CACHE_MAX_LEN = 4096
+
+def _normalize_text(text: str) -> str:
+    """Collapse whitespace, strip unsupported characters and fix punctuation spacing"""
     # Remove excessive whitespace
-    text = re.sub(r'\s+', ' ', text)
+    text = _WHITESPACE_RE.sub(' ', text)
     # Remove special characters but keep punctuation
-    text = re.sub(r'[^\w\s\.,!?;:\-\(\)\[\]{}"\']', ' ', text)
-    # Fix spacing around punctuation
-    text = re.sub(r'\s+([,.!?;:])', r'\1', text)
-    text = re.sub(r'([,.!?;:])\s*', r'\1 ', text)
+    if text.isascii():
+        text = text.translate(_SPECIAL_CHARS_ASCII_TABLE)
+    else:
+        text = _SPECIAL_CHARS_RE.sub(' ', text)
+    # Fix spacing around punctuation in a single pass
+    text = _PUNCT_SPACING_RE.sub(r'\1 ', text)
     
     return text.strip()
 
+@functools.lru_cache(maxsize=4096)
+def _clean_text_cached(text: str) -> str:
+    return _normalize_text(text)
+
+def clean_text(text: str) -> str:
+    """Clean and normalize text content, memoizing short repeated blocks such as headers and footers"""
+    if len(text) < TEXT_CACHE_MAX_LEN:
+        return _clean_text_cached(text)
+    return _normalize_text(text)
+
+# Keyword patterns per domain, each domain's alternatives compiled into one scanner
+_DOMAIN_PATTERNS = {
+    "insurance": [
+        r'\b(?:policy|coverage|premium|claim|benefit|deductible|copay)\b',
+        r'\b(?:waiting period|grace period|renewal|exclusion)\b',
+        r'\b(?:insured|insurer|policyholder|beneficiary)\b'
+    ],
+    "legal": [
+        r'\b(?:contract|agreement|clause|provision|liability)\b',
+        r'\b(?:terms|conditions|obligations|rights|duties)\b',
+        r'\b(?:breach|compliance|violation|penalty)\b'
+    ],
+    "hr": [
+        r'\b(?:employee|employer|employment|salary|benefits)\b',
+        r'\b(?:leave|vacation|sick|medical|dental)\b',
+        r'\b(?:performance|evaluation|promotion|termination)\b'
+    ]
+}
+_DOMAIN_KEYWORD_RES = {
+    domain: re.compile('|'.join(patterns), re.IGNORECASE) for domain, patterns in _DOMAIN_PATTERNS.items()
+}
+
+def _scan_domain_keywords(text: str, domain: str) -> Tuple[str, ...]:
+    pattern = _DOMAIN_KEYWORD_RES.get(domain, _DOMAIN_KEYWORD_RES["insurance"])
+    
+    # One scan per call; the set removes duplicates
+    return tuple({match.lower() for match in pattern.findall(text)})
+
+@functools.lru_cache(maxsize=256)
+def _domain_keywords_cached(text: str, domain: str) -> Tuple[str, ...]:
+    return _scan_domain_keywords(text, domain)
+
 def extract_domain_keywords(text: str, domain: str = "insurance") -> List[str]:
     """Extract domain-specific keywords from text"""
-    domain_patterns = {
-        "insurance": [
-            r'\b(?:policy|coverage|premium|claim|benefit|deductible|copay)\b',
-            r'\b(?:waiting period|grace period|renewal|exclusion)\b',
-            r'\b(?:insured|insurer|policyholder|beneficiary)\b'
-        ],
-        "legal": [
-            r'\b(?:contract|agreement|clause|provision|liability)\b',
-            r'\b(?:terms|conditions|obligations|rights|duties)\b',
-            r'\b(?:breach|compliance|violation|penalty)\b'
-        ],
-        "hr": [
-            r'\b(?:employee|employer|employment|salary|benefits)\b',
-            r'\b(?:leave|vacation|sick|medical|dental)\b',
-            r'\b(?:performance|evaluation|promotion|termination)\b'
-        ]
-    }
-    
-    keywords = []
-    patterns = domain_patterns.get(domain, domain_patterns["insurance"])
+    if len(text) < TEXT_CACHE_MAX_LEN:
+        return list(_domain_keywords_cached(text, domain))
+    return list(_scan_domain_keywords(text, domain))
+
+# Characters encoded per hash update, so large documents are never copied into one bytes object
+_HASH_BLOCK_CHARS = 1 << 20
+
+def create_document_hash(content: Union[str, bytes, bytearray, memoryview]) -> str:
+    """Create a hash for document content for caching
     
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        keywords.extend([match.lower() for match in matches])
+    Raw bytes, e.g. a downloaded document body, are hashed in place without a copy.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        digest.update(content)
+        return digest.hexdigest()
     
-    # Remove duplicates and return
-    return list(set(keywords))
+    for start in range(0, len(content), _HASH_BLOCK_CHARS):
+        digest.update(content[start:start + _HASH_BLOCK_CHARS].encode())
+    return digest.hexdigest()
 
-def create_document_hash(content: str) -> str:
-    """Create a hash for document content for caching"""
-    return hashlib.md5(content.encode()).hexdigest()
+# Plain http(s) URLs with a host, accepted without building a ParseResult
+_HTTP_URL_RE = re.compile(r'https?://[^/?#\[\]\s]+(?:[/?#]|\Z)', re.IGNORECASE)
 
 def is_valid_url(url: str) -> bool:
     """Check if URL is valid"""
+    if not isinstance(url, str) or not url:
+        return False
+    if _HTTP_URL_RE.match(url):
+        return True
+    
     try:
         result = urlparse(url)
         return all([result.scheme, result.netloc])
-    except:
+    except ValueError:
         return False
 
 def split_text_smartly(text: str, max_chunk_size: int, overlap: int = 100) -> List[str]:
@@ -63,50 +124,74 @@ def split_text_smartly(text: str, max_chunk_size: int, overlap: int = 100) -> Li
         return [text]
     
     chunks = []
-    sentences = re.split(r'(?<=[.!?])\s+', text)
+    sentences = _SENTENCE_SPLIT_RE.split(text)
+    overlap_words = overlap // 10
     
-    current_chunk = ""
+    # Sentences of the current chunk, joined once when it is emitted; length counts the joining spaces
+    current_parts: List[str] = []
+    current_length = 0
     
     for sentence in sentences:
         # Check if adding this sentence would exceed chunk size
-        if len(current_chunk) + len(sentence) > max_chunk_size and current_chunk:
+        if current_length + len(sentence) > max_chunk_size and current_length:
+            current_chunk = " ".join(current_parts)
             chunks.append(current_chunk.strip())
             
             # Start new chunk with overlap
+            # An overlap under one word carries nothing, matching DocumentProcessor._create_text_chunks
             words = current_chunk.split()
-            if len(words) > overlap // 10:
-                overlap_text = ' '.join(words[-(overlap // 10):])
-                current_chunk = overlap_text + " " + sentence
+            if overlap_words and len(words) > overlap_words:
+                overlap_text = ' '.join(words[-overlap_words:])
+                current_parts = [overlap_text, sentence]
+                current_length = len(overlap_text) + 1 + len(sentence)
             else:
-                current_chunk = sentence
+                current_parts = [sentence]
+                current_length = len(sentence)
+        elif current_length:
+            current_parts.append(sentence)
+            current_length += 1 + len(sentence)
         else:
-            if current_chunk:
-                current_chunk += " " + sentence
-            else:
-                current_chunk = sentence
+            current_parts = [sentence]
+            current_length = len(sentence)
     
     # Add final chunk
+    current_chunk = " ".join(current_parts)
     if current_chunk.strip():
         chunks.append(current_chunk.strip())
     
     return chunks
 
-def calculate_similarity_score(query_embedding, doc_embedding) -> float:
-    """Calculate cosine similarity between embeddings"""
+def calculate_similarity_score(query_embedding, doc_embedding, query_norm: Optional[float] = None, doc_norm: Optional[float] = None) -> float:
+    """Calculate cosine similarity between embeddings
+    
+    Pass precomputed norms (1.0 for normalized embeddings) to skip recomputing them.
+    """
+    if query_embedding is None or doc_embedding is None:
+        return 0.0
+    
+    if query_norm is None:
+        query_norm = float(np.linalg.norm(query_embedding))
+    if doc_norm is None:
+        doc_norm = float(np.linalg.norm(doc_embedding))
+    if query_norm == 0.0 or doc_norm == 0.0:
+        return 0.0
+    
     try:
-        import numpy as np
-        
-        # Normalize embeddings
-        query_norm = query_embedding / np.linalg.norm(query_embedding)
-        doc_norm = doc_embedding / np.linalg.norm(doc_embedding)
-        
-        # Calculate cosine similarity
-        similarity = np.dot(query_norm, doc_norm)
-        
-        return float(similarity)
-    except:
+        # One dot product; the norms scale the result instead of normalized copies of both vectors
+        return float(np.dot(query_embedding, doc_embedding)) / (query_norm * doc_norm)
+    except ValueError:
+        # Mismatched dimensions
         return 0.0
 
+def calculate_similarity_scores(query_embedding, doc_embeddings) -> List[float]:
+    """Calculate cosine similarity between one query and each row of a document embedding matrix"""
+    doc_embeddings = np.asarray(doc_embeddings, dtype=np.float32)
+    query_embedding = np.asarray(query_embedding, dtype=np.float32)
+    # A single matrix-vector product scores every document; zero vectors score 0.0
+    norms = np.linalg.norm(doc_embeddings, axis=1) * np.linalg.norm(query_embedding)
+    scores = doc_embeddings @ query_embedding
+    return np.divide(scores, norms, out=np.zeros_like(scores), where=norms > 0).tolist()
+
 def format_processing_time(seconds: float) -> str:
     """Format processing time in human-readable format"""
     if seconds < 1:
@@ -118,10 +203,76 @@ def format_processing_time(seconds: float) -> str:
         remaining_seconds = seconds % 60
         return f"{minutes}m {remaining_seconds:.1f}s"
 
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_DATE_RE = re.compile(
+    r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b|\b\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{2,4}\b',
+    re.IGNORECASE
+)
+
+def _compile_number_date_database():
+    """Both patterns in one Hyperscan database, reporting leftmost start offsets
+    
+    Hyperscan's digit and word-boundary classes are ASCII-only, so it only scans ASCII text.
+    """
+    database = hyperscan.Database()
+    flags = hyperscan.HS_FLAG_SOM_LEFTMOST
+    database.compile(
+        expressions=[_NUMBER_RE.pattern.encode(), _DATE_RE.pattern.encode()],
+        ids=[0, 1],
+        elements=2,
+        flags=[flags, flags | hyperscan.HS_FLAG_CASELESS]
+    )
+    return database
+
+_NUMBER_DATE_DB = _compile_number_date_database() if HYPERSCAN_AVAILABLE else None
+
+def _findall_spans(buffer: bytes, spans: List[tuple]) -> Optional[List[str]]:
+    """Turn Hyperscan's match reports into re.findall's non-overlapping matches
+    
+    Each end offset is reported with its leftmost start, so after keeping the longest
+    match per start the reports line up with re.findall unless two still overlap; then
+    a shorter match inside the overlap may be hidden and None defers to the regex engine.
+    """
+    longest: Dict[int, int] = {}
+    for start, end in spans:
+        if end > longest.get(start, -1):
+            longest[start] = end
+    
+    found = []
+    last_end = 0
+    for start in sorted(longest):
+        if start < last_end:
+            return None
+        last_end = longest[start]
+        found.append(buffer[start:last_end].decode("ascii"))
+    return found
+
+def _scan_numbers_and_dates(text: str) -> Dict[str, List[str]]:
+    """Find numbers and dates in a single Hyperscan pass over ASCII text"""
+    buffer = text.encode("ascii")
+    spans: Dict[int, List[tuple]] = {0: [], 1: []}
+    
+    def on_match(pattern_id, start, end, flags, context):
+        spans[pattern_id].append((start, end))
+    
+    _NUMBER_DATE_DB.scan(buffer, match_event_handler=on_match)
+    numbers = _findall_spans(buffer, spans[0])
+    dates = _findall_spans(buffer, spans[1])
+    return {
+        "numbers": _NUMBER_RE.findall(text) if numbers is None else numbers,
+        "dates": _DATE_RE.findall(text) if dates is None else dates
+    }
+
 def extract_numbers_and_dates(text: str) -> Dict[str, List[str]]:
     """Extract numbers and dates from text"""
-    numbers = re.findall(r'\b\d+(?:\.\d+)?\b', text)
-    dates = re.findall(r'\b\d{1,2}[-/]\d{1,2}[-/]\d{2,4}\b|\b\d{1,2}\s+(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\s+\d{2,4}\b', text, re.IGNORECASE)
+    if _NUMBER_DATE_DB is not None and text.isascii():
+        try:
+            return _scan_numbers_and_dates(text)
+        except hyperscan.error:
+            pass  # Fall back to the regex engine
+    
+    numbers = _NUMBER_RE.findall(text)
+    dates = _DATE_RE.findall(text)
     
     return {
         "numbers": numbers,